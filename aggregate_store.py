@@ -0,0 +1,185 @@
+"""
+On-disk store of per-hall, per-day report aggregates.
+
+Two families of daily facts are kept in a local SQLite file:
+
+- ``over_production``: Total_Cost of the ``**`` categories (Reused, Thrown, ...)
+  per hall, day and category, as used by the monthly summary.
+- ``service``: the weekly report's daily customer counts, pre/post-service
+  costs and revenue per hall and day.
+
+Each save is tagged with a fingerprint of the data it came from, so re-running
+an unchanged period is a lookup, and a month can be rolled up from stored days
+instead of re-parsing the raw exports. Rows with an unparseable eventdate have
+no day to live under and are not stored.
+"""
+import hashlib
+import os
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+
+DEFAULT_STORE_PATH = os.environ.get("OVERPRODUCTION_STORE", "aggregates.sqlite3")
+
+SERVICE_METRICS = ['pre_service_cust_count', 'post_service_customer_count',
+                   'pre_service_total_cost', 'post_service_total_cost', 'revenue']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    hall TEXT NOT NULL,
+    family TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    PRIMARY KEY (hall, family, fingerprint)
+);
+CREATE TABLE IF NOT EXISTS over_production (
+    hall TEXT NOT NULL,
+    date TEXT NOT NULL,
+    category TEXT NOT NULL,
+    total_cost REAL NOT NULL,
+    PRIMARY KEY (hall, date, category)
+);
+CREATE TABLE IF NOT EXISTS service (
+    hall TEXT NOT NULL,
+    date TEXT NOT NULL,
+    pre_service_cust_count REAL NOT NULL,
+    post_service_customer_count REAL NOT NULL,
+    pre_service_total_cost REAL NOT NULL,
+    post_service_total_cost REAL NOT NULL,
+    revenue REAL NOT NULL,
+    PRIMARY KEY (hall, date)
+);
+"""
+
+_FAMILY_COLUMNS = {
+    "over_production": ["category", "total_cost"],
+    "service": SERVICE_METRICS,
+}
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """Content hash of a DataFrame (values and column names, not the index)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update("\x1f".join(map(str, df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def daily_over_production(df: pd.DataFrame):
+    """Total_Cost per day and ``**`` category (prefix stripped) for one hall's rows."""
+    rows = df[df["srvcrsname"].str.startswith("**", na=False)]
+    dates = pd.to_datetime(rows["eventdate"], errors="coerce").dt.normalize()
+    categories = rows["srvcrsname"].str.replace("**", "", regex=False)
+    daily = rows.groupby([dates.rename("date"), categories.rename("category")], observed=True)["Total_Cost"].sum()
+    return daily.rename("total_cost").reset_index()
+
+
+class AggregateStore:
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        # Several batch workers may write at once; wait for the lock rather than fail
+        return sqlite3.connect(self.path, timeout=60)
+
+    def known(self, hall: str, family: str, fingerprint: str):
+        """The (start, end) dates stored for ``fingerprint``, or None if it was never saved."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT start_date, end_date FROM sources WHERE hall = ? AND family = ? AND fingerprint = ?",
+                (hall, family, fingerprint),
+            ).fetchone()
+        if row is None:
+            return None
+        return pd.Timestamp(row[0]), pd.Timestamp(row[1])
+
+    def save(self, hall: str, family: str, daily: pd.DataFrame, fingerprint: str):
+        """
+        Replace the stored days of ``hall`` from the first to the last day of
+        ``daily`` with its rows.
+
+        ``daily`` has a ``date`` column plus the family's metric columns. Any
+        earlier source overlapping these days is forgotten so it is re-aggregated
+        if it comes back.
+        """
+        columns = _FAMILY_COLUMNS[family]
+        daily = daily.dropna(subset=["date"])
+        if daily.empty:
+            return
+        dates = pd.to_datetime(daily["date"]).dt.strftime("%Y-%m-%d")
+        start, end = dates.min(), dates.max()
+        records = zip([hall] * len(daily), dates, *(daily[column].tolist() for column in columns))
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "DELETE FROM sources WHERE hall = ? AND family = ? AND start_date <= ? AND end_date >= ?",
+                (hall, family, end, start),
+            )
+            # The whole span is replaced, so days the new source no longer has are dropped too
+            conn.execute(f"DELETE FROM {family} WHERE hall = ? AND date BETWEEN ? AND ?", (hall, start, end))
+            placeholders = ", ".join("?" * (len(columns) + 2))
+            conn.executemany(
+                f"INSERT INTO {family} (hall, date, {', '.join(columns)}) VALUES ({placeholders})",
+                records,
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?)",
+                (hall, family, fingerprint, start, end),
+            )
+
+    def _query(self, sql: str, params):
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+    @staticmethod
+    def _where(start=None, end=None, halls=None):
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("date >= ?")
+            params.append(pd.Timestamp(start).strftime("%Y-%m-%d"))
+        if end is not None:
+            clauses.append("date <= ?")
+            params.append(pd.Timestamp(end).strftime("%Y-%m-%d"))
+        if halls:
+            clauses.append(f"hall IN ({', '.join('?' * len(halls))})")
+            params.extend(halls)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def halls(self, family: str):
+        return self._query(f"SELECT DISTINCT hall FROM {family} ORDER BY hall", [])["hall"].tolist()
+
+    def over_production_costs(self, start=None, end=None, halls=None):
+        """Total_Cost per (category, hall) rolled up over the stored days in [start, end]."""
+        where, params = self._where(start, end, halls)
+        costs = self._query(
+            f"SELECT category, hall, SUM(total_cost) AS total_cost FROM over_production{where} "
+            f"GROUP BY category, hall",
+            params,
+        )
+        return costs.set_index(["category", "hall"])["total_cost"]
+
+    def over_production_days(self, start=None, end=None, halls=None):
+        """Per-day over production rows (date, hall, category, total_cost) in [start, end]."""
+        where, params = self._where(start, end, halls)
+        days = self._query(f"SELECT date, hall, category, total_cost FROM over_production{where}", params)
+        days["date"] = pd.to_datetime(days["date"])
+        return days
+
+    def service_summary(self, hall: str, start=None, end=None):
+        """The stored daily service metrics of ``hall``, shaped like summarize_daily's output."""
+        where, params = self._where(start, end, [hall])
+        summary = self._query(f"SELECT date, {', '.join(SERVICE_METRICS)} FROM service{where} ORDER BY date", params)
+        summary["date"] = pd.to_datetime(summary["date"]).dt.date
+        return summary.rename(columns={"date": "Date"})
+
+    def date_range(self, family: str, start=None, end=None, halls=None):
+        where, params = self._where(start, end, halls)
+        first, last = self._query(f"SELECT MIN(date) AS first, MAX(date) AS last FROM {family}{where}",
+                                  params).iloc[0]
+        if first is None:
+            return None
+        return pd.Timestamp(first), pd.Timestamp(last)
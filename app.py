@@ -1,9 +1,13 @@
 import os
+from io import BytesIO
 
-import pandas as pd
 import streamlit as st
 
 from generate_report import generate_report
+from ingest import HALL_SHEETS, file_hash, read_hall_sheets
+from instrumentation import is_enabled, recording, render_sidebar, stage
+from report_cache import cached_report, get_or_render, report_key
+from schema import MONTHLY_COLUMNS, validate_export_excel
 
 REMOVE_BARS = True
 
@@ -21,6 +25,14 @@ def main():
     # Set Streamlit to full-width mode
     st.set_page_config(layout="wide")
 
+    # Per-stage timings for this run, shown in the sidebar
+    record_timings = st.sidebar.checkbox("⏱️ Record stage timings", value=is_enabled())
+    with recording(enabled=record_timings) as records:
+        report_page()
+    render_sidebar(records)
+
+
+def report_page():
     # Initialize session state variables
     if "grid_update_key" not in st.session_state:
         st.session_state["grid_update_key"] = 0
@@ -33,25 +45,33 @@ def main():
 
     # Ensure all three files are uploaded
     if file:
-        evk_df = pd.read_excel(file, sheet_name="EVK")
-        irc_df = pd.read_excel(file, sheet_name="IRC")
-        uv_df = pd.read_excel(file, sheet_name="UV")
-
+        # Sheets and columns are checked from the first rows as soon as the file arrives
+        digest = file_hash(file)
+        checked = st.session_state.get("monthly_check")
+        if checked is None or checked[0] != digest:
+            checked = st.session_state["monthly_check"] = (digest, check_upload(file))
+        if checked[1] is not None:
+            st.error(checked[1])
+            return
         st.success("✅ File uploaded successfully!")
 
+        # The same upload rendered with the same parameters is the same workbook
+        params = {"constant_memory": False}
+        key = report_key("monthly", digest, **params)
+
         # **Generate Report Button**
         if st.button("📥 Generate Report"):
-            # Generate the final report using the fully updated DataFrames
-            buffer = generate_report(
-                evk_df,
-                irc_df,
-                uv_df
-            )
+            # Rendered once per server and shared by every session that asks for it
+            with stage("monthly.report", cached=cached_report(key) is not None):
+                st.session_state["monthly_report"] = (key, get_or_render(key, lambda: build_report(file, **params)))
 
+        # Kept in the session so the download button survives reruns, including the one its click triggers
+        report = st.session_state.get("monthly_report")
+        if report is not None and report[0] == key:
             # Provide the report as a downloadable link
             st.download_button(
                 label="📥 Download Report",
-                data=buffer,
+                data=report[1],
                 file_name="Over_Production_Summary.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
             )
@@ -59,5 +79,33 @@ def main():
         st.warning("⚠️ Please upload the CSV file before proceeding.")
 
 
+def check_upload(file):
+    """The problems found in the upload's EVK, IRC and UV sheets, or None."""
+    with stage("monthly.validate"):
+        try:
+            validate_export_excel(BytesIO(file.getvalue()), HALL_SHEETS, MONTHLY_COLUMNS, file.name)
+        except ValueError as exc:
+            return str(exc)
+    return None
+
+
+def build_report(file, constant_memory: bool = False):
+    # Parsed once per distinct upload (see ingest.read_hall_sheets)
+    with stage("monthly.ingest") as record:
+        sheets = read_hall_sheets(file, columns=MONTHLY_COLUMNS)
+        record["rows"] = sum(len(df) for df in sheets.values())
+    evk_df = sheets["EVK"]
+    irc_df = sheets["IRC"]
+    uv_df = sheets["UV"]
+
+    # Generate the final report using the fully updated DataFrames
+    return generate_report(
+        evk_df,
+        irc_df,
+        uv_df,
+        constant_memory=constant_memory
+    )
+
+
 if __name__ == "__main__":
     main()
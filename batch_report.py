@@ -0,0 +1,248 @@
+"""
+Headless batch generation of monthly and weekly over production reports.
+
+Monthly exports are .xlsx workbooks with EVK, IRC and UV sheets; each one
+becomes a monthly summary. Weekly exports are per-hall .csv files whose name
+contains the hall code (e.g. ``EVK_2025-03-31.csv``); files that share the
+rest of their name form one period and become one weekly workbook.
+
+    python batch_report.py exports/ -o reports/ -j 8
+    python batch_report.py exports/ --chunksize 200000   # bounded-memory weekly aggregation
+    python batch_report.py exports/ --store aggregates.sqlite3   # reuse unchanged periods
+    python batch_report.py exports/ --iso-weeks   # one weekly workbook per ISO week of long exports
+    python batch_report.py exports/ --from 2025-04-01 --to 2025-04-30   # any date window
+    python batch_report.py exports/ --iso-weeks --monthly-summary   # plus the monthly summary of the same data
+    python batch_report.py --from-store --store aggregates.sqlite3 --from 2025-04-01 --to 2025-04-30
+"""
+import argparse
+import os
+import re
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from aggregate_store import AggregateStore
+from ingest import HALL_SHEETS, hall_from_name
+
+
+def _period_key(stem: str, hall: str) -> str:
+    key = re.sub(r"(?<![A-Za-z])" + hall + r"(?![A-Za-z])", "", stem, count=1, flags=re.IGNORECASE)
+    key = re.sub(r"[\s_\-]+", "_", key).strip("_")
+    return key or "weekly"
+
+
+def discover_jobs(input_dir: str, output_dir: str, chunksize: int = None, constant_memory: bool = False,
+                  store_path: str = None, iso_weeks: bool = False, window=None, monthly_summary: bool = False):
+    """
+    Return one job per monthly workbook and one per weekly period found in ``input_dir``.
+
+    With ``iso_weeks`` or a (start, end) ``window`` the weekly exports are read
+    as long exports and reported per ISO week or for the window instead;
+    ``monthly_summary`` adds the monthly summary of the same rows.
+    """
+    jobs = []
+    weekly_periods = {}
+    for name in sorted(os.listdir(input_dir)):
+        path = os.path.join(input_dir, name)
+        stem, ext = os.path.splitext(name)
+        ext = ext.lower()
+        if not os.path.isfile(path) or name.startswith("~$"):
+            continue
+        if ext == ".xlsx":
+            jobs.append({
+                "kind": "monthly",
+                "period": stem,
+                "inputs": {"workbook": path},
+                "output": os.path.join(output_dir, f"{stem}_Over_Production_Summary.xlsx"),
+                "constant_memory": constant_memory,
+                "store": store_path,
+            })
+        elif ext == ".csv":
+            hall = hall_from_name(stem)
+            if hall is None:
+                continue
+            weekly_periods.setdefault(_period_key(stem, hall), {})[hall] = path
+
+    for period, halls in sorted(weekly_periods.items()):
+        # Keep the sheet order of the weekly app
+        ordered = {hall: halls[hall] for hall in HALL_SHEETS if hall in halls}
+        jobs.append({
+            "kind": "weekly",
+            "period": period,
+            "inputs": ordered,
+            "output": os.path.join(output_dir, f"{period}_Weekly_Summary.xlsx"),
+            "chunksize": chunksize,
+            "constant_memory": constant_memory,
+            "store": store_path,
+            "iso_weeks": iso_weeks,
+            "window": window,
+            "monthly_summary": monthly_summary,
+        })
+    return jobs
+
+
+def store_jobs(store_path: str, output_dir: str, window=None, constant_memory: bool = False):
+    """
+    One monthly and one weekly job rolled up from the days saved in the store
+    at ``store_path``, for the (start, end) ``window`` or every stored day.
+    """
+    period = "{}_to_{}".format(*window) if window else "stored"
+    return [{
+        "kind": kind,
+        "period": period,
+        "inputs": {},
+        "output": os.path.join(output_dir, f"{period}_{suffix}.xlsx"),
+        "constant_memory": constant_memory,
+        "store": store_path,
+        "from_store": True,
+        "window": window,
+    } for kind, suffix in (("monthly", "Over_Production_Summary"), ("weekly", "Weekly_Summary"))]
+
+
+def _rows_between(data: pd.DataFrame, start, end):
+    eventdate = pd.to_datetime(data["eventdate"], errors="coerce").dt.normalize()
+    return data[eventdate.between(pd.Timestamp(start), pd.Timestamp(end)).to_numpy()]
+
+
+def _long_export_reports(job: dict, frames: dict):
+    from generate_report import generate_report
+    from generate_weekly_report import build_iso_week_workbooks, build_window_workbook, index_halls
+
+    constant_memory = job["constant_memory"]
+    stem = job["output"][:-len("_Weekly_Summary.xlsx")]
+    if job.get("window"):
+        outputs = {job["output"]: build_window_workbook(index_halls(frames), *job["window"],
+                                                        constant_memory=constant_memory)}
+    else:
+        outputs = {f"{stem}_{monday:%Y-%m-%d}_Weekly_Summary.xlsx": buffer
+                   for (monday, _), buffer in build_iso_week_workbooks(frames, constant_memory).items()}
+    if job.get("monthly_summary"):
+        if job.get("window"):
+            frames = {hall: _rows_between(data, *job["window"]) for hall, data in frames.items()}
+        outputs[f"{stem}_Over_Production_Summary.xlsx"] = generate_report(frames, constant_memory=constant_memory)
+    return outputs
+
+
+def run_job(job: dict):
+    """Build a single report and write it to disk. Runs inside a worker process."""
+    from generate_report import generate_report, generate_report_from_store
+    from generate_weekly_report import build_weekly_workbook, build_weekly_workbook_from_store
+    from ingest import read_csv_export, read_hall_sheets
+    from schema import MONTHLY_COLUMNS, WEEKLY_COLUMNS
+
+    started = time.perf_counter()
+    result = {"kind": job["kind"], "period": job["period"], "output": job["output"], "error": None}
+    try:
+        store = AggregateStore(job["store"]) if job.get("store") else None
+        if job.get("from_store"):
+            window = job.get("window") or (None, None)
+            build = generate_report_from_store if job["kind"] == "monthly" else build_weekly_workbook_from_store
+            outputs = {job["output"]: build(store, *window, constant_memory=job["constant_memory"])}
+        elif job["kind"] == "monthly":
+            sheets = read_hall_sheets(job["inputs"]["workbook"], columns=MONTHLY_COLUMNS)
+            outputs = {job["output"]: generate_report(sheets, constant_memory=job["constant_memory"], store=store)}
+        elif job.get("iso_weeks") or job.get("window"):
+            columns = None if job.get("monthly_summary") else WEEKLY_COLUMNS
+            frames = {hall: read_csv_export(path, columns) for hall, path in job["inputs"].items()}
+            outputs = _long_export_reports(job, frames)
+        elif job.get("chunksize"):
+            outputs = {job["output"]: build_weekly_workbook(job["inputs"], chunksize=job["chunksize"],
+                                                            constant_memory=job["constant_memory"], store=store)}
+        else:
+            frames = {hall: read_csv_export(path, WEEKLY_COLUMNS) for hall, path in job["inputs"].items()}
+            outputs = {job["output"]: build_weekly_workbook(frames, constant_memory=job["constant_memory"],
+                                                            store=store)}
+
+        for path, buffer in outputs.items():
+            with open(path, "wb") as fh:
+                fh.write(buffer.getvalue())
+        result["outputs"] = list(outputs)
+    except Exception:
+        result["error"] = traceback.format_exc()
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def run_batch(jobs, workers=None, log=print):
+    """Run ``jobs`` in a process pool and return their results in completion order."""
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_job, job) for job in jobs]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            status = "FAILED" if result["error"] else "ok"
+            log(f"{status:>6}  {result['kind']:<7}  {result['period']:<30}  {result['seconds']:7.2f}s")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build monthly and weekly over production reports in bulk.")
+    parser.add_argument("input_dir", nargs="?", help="directory containing the .xlsx and .csv exports")
+    parser.add_argument("-o", "--output-dir", default="reports", help="where to write the workbooks")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="stream weekly CSVs in chunks of this many rows to bound memory")
+    parser.add_argument("--constant-memory", action="store_true",
+                        help="use xlsxwriter's row-streaming mode when rendering")
+    parser.add_argument("--store", default=None,
+                        help="SQLite aggregate store to update and reuse (see aggregate_store.py)")
+    parser.add_argument("--iso-weeks", action="store_true",
+                        help="treat weekly CSVs as long exports and write one workbook per ISO week in them")
+    parser.add_argument("--from-store", action="store_true",
+                        help="roll the reports up from the days saved in --store instead of reading exports")
+    parser.add_argument("--from", dest="start", default=None,
+                        help="first day of a weekly report window or of the --from-store reports")
+    parser.add_argument("--to", dest="end", default=None,
+                        help="last day of a weekly report window or of the --from-store reports")
+    parser.add_argument("--monthly-summary", action="store_true",
+                        help="with --iso-weeks or --from/--to, also write the monthly summary of the same rows")
+    parser.add_argument("--monthly-only", action="store_true", help="skip weekly exports")
+    parser.add_argument("--weekly-only", action="store_true", help="skip monthly exports")
+    args = parser.parse_args(argv)
+    if (args.start is None) != (args.end is None):
+        parser.error("--from and --to go together")
+    if args.from_store and not args.store:
+        parser.error("--from-store needs --store")
+    if not args.from_store and args.input_dir is None:
+        parser.error("input_dir is required unless --from-store is given")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    window = (args.start, args.end) if args.start else None
+    if args.from_store:
+        jobs = store_jobs(args.store, args.output_dir, window, constant_memory=args.constant_memory)
+    else:
+        jobs = discover_jobs(args.input_dir, args.output_dir, chunksize=args.chunksize,
+                             constant_memory=args.constant_memory, store_path=args.store, iso_weeks=args.iso_weeks,
+                             window=window, monthly_summary=args.monthly_summary)
+    if args.store:
+        # Create the schema once up front rather than racing in every worker
+        AggregateStore(args.store)
+    if args.monthly_only:
+        jobs = [job for job in jobs if job["kind"] == "monthly"]
+    if args.weekly_only:
+        jobs = [job for job in jobs if job["kind"] == "weekly"]
+    source = args.store if args.from_store else args.input_dir
+    if not jobs:
+        print(f"No exports found in {source}")
+        return 1
+
+    print(f"Building {len(jobs)} report(s) from {source}")
+    started = time.perf_counter()
+    results = run_batch(jobs, workers=args.workers)
+    elapsed = time.perf_counter() - started
+
+    failures = [result for result in results if result["error"]]
+    for result in failures:
+        print(f"\n{result['kind']} {result['period']} failed:\n{result['error']}")
+    busy = sum(result["seconds"] for result in results)
+    print(f"\n{len(results) - len(failures)} succeeded, {len(failures)} failed "
+          f"in {elapsed:.2f}s wall ({busy:.2f}s of job time)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+Benchmarks for each stage of the report pipeline on synthetic exports.
+
+Every stage is timed (best of ``--repeat`` runs) and its peak Python/numpy
+allocation is measured in a separate run under tracemalloc. Results can be
+saved as a baseline and later runs compared against it:
+
+    python benchmark.py --sizes 10000 100000 1000000 --save benchmark_baseline.json
+    python benchmark.py --sizes 10000 100000 1000000 --compare benchmark_baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+import pandas as pd
+import xlsxwriter
+
+import flag_and_update
+import generate_report
+import columnar_cache
+import generate_weekly_report
+from schema import WEEKLY_COLUMNS, read_export_csv
+from synthetic_data import generate_export, write_export_csv
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+HALLS = ["EVK", "IRC", "UV"]
+
+# read_excel is orders of magnitude slower than the rest; skip it above this size
+MAX_EXCEL_ROWS = 200_000
+
+
+def _render_weekly(summary):
+    output = BytesIO()
+    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+    daily, revenue_table = generate_weekly_report.finish_summary(summary)
+    generate_weekly_report.write_report(daily, revenue_table, workbook, workbook.add_worksheet("EVK"))
+    workbook.close()
+    return output
+
+
+def build_stages(n_rows: int, workdir: str):
+    """Return (name, callable) pairs for one input size; inputs are generated up front."""
+    csv_path = os.path.join(workdir, f"export_{n_rows}.csv")
+    write_export_csv(csv_path, n_rows)
+    frame = pd.read_csv(csv_path)
+    hall_frames = {hall: generate_export(n_rows // len(HALLS), seed=i) for i, hall in enumerate(HALLS)}
+    long_df, halls = generate_report.combine_halls(hall_frames)
+    hall_pivots = generate_report.create_hall_pivots(long_df, halls)
+    summary = generate_weekly_report.summarize_daily(frame)
+
+    stages = [
+        ("ingest.read_csv", lambda: pd.read_csv(csv_path)),
+        ("ingest.read_export_csv", lambda: read_export_csv(csv_path, WEEKLY_COLUMNS)),
+        ("weekly.summarize_daily", lambda: generate_weekly_report.summarize_daily(frame)),
+        ("weekly.summarize_daily_csv", lambda: generate_weekly_report.summarize_daily_csv(csv_path)),
+        ("weekly.render", lambda: _render_weekly(summary)),
+        ("monthly.create_hall_pivots", lambda: generate_report.create_hall_pivots(long_df, halls)),
+        ("monthly.render", lambda: generate_report.render_report(hall_pivots, pd.Timestamp("2025-03-31"),
+                                                                 pd.Timestamp("2025-04-06"))),
+        ("monthly.generate_report", lambda: generate_report.generate_report(hall_frames)),
+        ("weekly.index_by_date", lambda: generate_weekly_report.index_by_date(frame)),
+        ("flag.global", lambda: flag_and_update.flag_rows(frame)),
+        ("flag.grouped", lambda: flag_and_update.flag_rows(frame, by=["srvcrsname", "itemname"])),
+    ]
+    if n_rows <= MAX_EXCEL_ROWS:
+        xlsx = BytesIO()
+        with pd.ExcelWriter(xlsx) as writer:
+            for hall, df in hall_frames.items():
+                df.to_excel(writer, sheet_name=hall, index=False)
+        data = xlsx.getvalue()
+        stages.insert(0, ("ingest.read_excel", lambda: pd.read_excel(BytesIO(data), sheet_name=HALLS)))
+    if columnar_cache.available():
+        cache = columnar_cache.ColumnarCache(os.path.join(workdir, f"columnar_{n_rows}"))
+        cache.put("export", {None: read_export_csv(csv_path)})
+        stages.insert(1, ("ingest.columnar_cache", lambda: cache.get("export", columns=WEEKLY_COLUMNS)))
+    return stages
+
+
+def measure(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(timings), "peak_mb": peak / 2 ** 20}
+
+
+def run(sizes, repeat: int = 3, stage_filter=None, log=print):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for n_rows in sizes:
+            for name, fn in build_stages(n_rows, workdir):
+                if stage_filter and not any(pattern in name for pattern in stage_filter):
+                    continue
+                result = measure(fn, repeat)
+                results[f"{name}[{n_rows}]"] = result
+                log(f"{name:<30} {n_rows:>10,} rows  {result['seconds']:9.4f}s  {result['peak_mb']:9.1f} MB")
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float, log=print):
+    """Log each stage against the baseline; return the keys that regressed beyond ``tolerance``."""
+    regressions = []
+    for key, result in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        time_ratio = result["seconds"] / previous["seconds"] if previous["seconds"] else 1.0
+        memory_ratio = result["peak_mb"] / previous["peak_mb"] if previous["peak_mb"] else 1.0
+        regressed = time_ratio > 1 + tolerance or memory_ratio > 1 + tolerance
+        if regressed:
+            regressions.append(key)
+        log(f"{'REGRESSED' if regressed else 'ok':>9}  {key:<42} time x{time_ratio:5.2f}  memory x{memory_ratio:5.2f}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the over production report pipeline.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="row counts to benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage (best is kept)")
+    parser.add_argument("--stage", action="append", help="only run stages whose name contains this text")
+    parser.add_argument("--save", metavar="PATH", help="write the results as a baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown or memory growth before a stage counts as regressed")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat, args.stage)
+
+    if args.save:
+        with open(args.save, "w") as fh:
+            json.dump({"machine": platform.platform(), "python": platform.python_version(),
+                       "pandas": pd.__version__, "results": results}, fh, indent=2)
+        print(f"Saved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+        print(f"\nCompared with {args.compare} ({baseline.get('machine')}, pandas {baseline.get('pandas')})")
+        regressions = compare(results, baseline["results"], args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) regressed")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+On-disk columnar cache of parsed exports.
+
+The first time an export is seen, its typed frames (see schema.py) are written
+as uncompressed Arrow IPC files named by the content hash of the upload.
+Later runs on the same bytes memory-map those files instead of parsing the
+spreadsheet again, reading only the columns they ask for. Numeric columns
+without missing values come back without a copy, so such frames are
+read-only; copy before modifying them in place.
+
+Files are evicted oldest-used first once the directory grows past
+``max_bytes``. The cache needs pyarrow (see requirements.txt); without it
+``available()`` is False, nothing is written, every lookup misses and a
+warning says so once.
+"""
+import logging
+import os
+import tempfile
+import threading
+from urllib.parse import quote
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # optional dependency
+    pa = None
+
+logger = logging.getLogger("overproduction.columnar_cache")
+
+DEFAULT_CACHE_DIR = os.environ.get("OVERPRODUCTION_COLUMNAR_CACHE", ".columnar_cache")
+
+# Upper bound on the total size of the cache directory (bytes).
+DEFAULT_MAX_DISK_BYTES = 2 * 1024 ** 3
+
+_SUFFIX = ".arrow"
+
+_missing_reported = False
+
+
+def available() -> bool:
+    global _missing_reported
+    if pa is None and not _missing_reported:
+        _missing_reported = True
+        logger.warning("pyarrow is not installed; the columnar cache is disabled and every export is parsed again")
+    return pa is not None
+
+
+class ColumnarCache:
+    """Arrow IPC files of parsed frames keyed by (content hash, sheet), bounded by their total size on disk."""
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_DISK_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, key: str, name: str = None):
+        filename = key if name is None else f"{key}.{quote(str(name), safe='')}"
+        return os.path.join(self.directory, filename + _SUFFIX)
+
+    def get(self, key: str, names=(None,), columns=None):
+        """
+        The cached frames of ``names`` as a dict, or None unless every one is cached.
+
+        Only ``columns`` (those present) are read, through a memory map.
+        """
+        if not available():
+            return None
+        paths = {name: self._path(key, name) for name in names}
+        if not all(os.path.exists(path) for path in paths.values()):
+            return None
+        frames = {}
+        try:
+            for name, path in paths.items():
+                frames[name] = self._load(path, columns)
+                os.utime(path)  # mark as recently used
+        except (OSError, pa.ArrowException):
+            # Evicted or half-written by another process meanwhile
+            return None
+        return frames
+
+    @staticmethod
+    def _load(path: str, columns):
+        # Reading a memory-mapped IPC file only maps it; selecting columns afterwards copies nothing
+        table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        if columns is not None:
+            table = table.select([name for name in columns if name in table.schema.names])
+        return table.to_pandas(split_blocks=True)
+
+    def put(self, key: str, frames: dict):
+        """Write each frame of ``frames`` (name -> frame) under ``key``, then evict down to ``max_bytes``."""
+        if not available():
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        for name, df in frames.items():
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            # Write to a temporary file and rename, so readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            os.close(fd)
+            try:
+                feather.write_feather(table, tmp_path, compression="uncompressed")
+                os.replace(tmp_path, self._path(key, name))
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        self.evict()
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(_SUFFIX):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:  # still mapped on Windows, or already gone
+                    continue
+                total -= size
+
+    def size(self) -> int:
+        if not os.path.isdir(self.directory):
+            return 0
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.name.endswith(_SUFFIX))
+
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(_SUFFIX):
+                os.remove(entry.path)
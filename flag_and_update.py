@@ -1,11 +1,142 @@
+import math
+
+import numpy as np
 import pandas as pd
 
+# Rows per chunk when streaming a CSV export
+DEFAULT_CHUNKSIZE = 200_000
+
+# Bucket that collects zero and negative cost prices (they have no logarithm)
+_NON_POSITIVE_BUCKET = -(2 ** 62)
+
+
+def _group_keys(by):
+    if by is None:
+        return []
+    return [by] if isinstance(by, str) else list(by)
+
+
+def flag_rows(df: pd.DataFrame, by=None, q: float = 0.99):
+    """
+    Rows whose costprice is above the ``q`` quantile of their group.
+
+    ``by`` names the grouping columns, e.g. ``["hall", "srvcrsname"]`` or
+    ``"itemname"``; without it one cutoff is computed over the whole frame.
+    All group thresholds come from a single grouped quantile.
+    """
+    costprice = df['costprice']
+    keys = _group_keys(by)
+    if not keys:
+        return df[costprice > costprice.quantile(q)]
+
+    thresholds = df.groupby(keys, observed=True, sort=False)['costprice'].transform('quantile', q)
+    return df[costprice > thresholds]
+
+
+class QuantileSketch:
+    """
+    Mergeable approximate quantiles of costprice, optionally per group.
+
+    Values are counted in logarithmic buckets (as in DDSketch), so any quantile
+    is returned within ``relative_accuracy`` of a value present in the data and
+    memory depends on the number of groups and buckets, never on the row count.
+    Sketches of separate chunks or files combine exactly with merge().
+    Zero and negative prices share one bucket reported as 0.
+    """
+
+    def __init__(self, by=None, relative_accuracy: float = 0.01):
+        self.by = _group_keys(by)
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.counts = None
+
+    def update(self, df: pd.DataFrame):
+        values = pd.to_numeric(df['costprice'], errors='coerce')
+        valid = values.notna()
+        values = values[valid].to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            buckets = np.where(values > 0, np.ceil(np.log(values) / self._log_gamma), _NON_POSITIVE_BUCKET)
+        keys = [df.loc[valid, column].to_numpy() for column in self.by]
+        keys.append(buckets.astype(np.int64))
+        partial = pd.Series(1, index=pd.MultiIndex.from_arrays(keys, names=self.by + ['_bucket']))
+        partial = partial.groupby(level=list(range(len(keys)))).sum()
+        self._add(partial)
+        return self
+
+    def merge(self, other: "QuantileSketch"):
+        if other.by != self.by or other.gamma != self.gamma:
+            raise ValueError("Only sketches with the same groups and accuracy can be merged")
+        if other.counts is not None:
+            self._add(other.counts)
+        return self
+
+    def _add(self, partial: pd.Series):
+        self.counts = partial if self.counts is None else self.counts.add(partial, fill_value=0)
+
+    def _bucket_value(self, buckets):
+        buckets = np.asarray(buckets, dtype=np.int64)
+        estimate = 2 * np.power(self.gamma, buckets.astype(float)) / (self.gamma + 1)
+        return np.where(buckets == _NON_POSITIVE_BUCKET, 0.0, estimate)
+
+    def quantile(self, q: float):
+        """The approximate ``q`` quantile: a scalar without groups, else a Series indexed by group."""
+        if self.counts is None:
+            raise ValueError("The sketch is empty")
+        counts = self.counts.sort_index()
+        if not self.by:
+            cumulative = counts.cumsum()
+            rank = q * (counts.sum() - 1)
+            bucket = counts.index.get_level_values(-1)[np.argmax(cumulative.to_numpy() > rank)]
+            return float(self._bucket_value([bucket])[0])
+
+        levels = list(range(len(self.by)))
+        grouped = counts.groupby(level=levels, sort=False)
+        reached = counts[grouped.cumsum() > q * (grouped.transform('sum') - 1)]
+        first = reached.groupby(level=levels, sort=False).head(1).index
+        groups = first.droplevel(-1)
+        return pd.Series(self._bucket_value(first.get_level_values(-1)), index=groups, name='costprice')
+
+
+def _thresholds_for(chunk: pd.DataFrame, thresholds, keys):
+    if not keys:
+        return thresholds
+    if len(keys) == 1:
+        lookup = pd.Index(chunk[keys[0]])
+    else:
+        lookup = pd.MultiIndex.from_frame(chunk[keys])
+    return pd.Series(thresholds.reindex(lookup).to_numpy(), index=chunk.index)
+
+
+def flag_rows_streaming(source, by=None, q: float = 0.99, chunksize: int = DEFAULT_CHUNKSIZE,
+                        relative_accuracy: float = 0.01):
+    """
+    Approximate flag_rows for a CSV too large to load whole.
+
+    The file is read twice in chunks: once to build a QuantileSketch per group,
+    then again to keep the rows above their group's approximate threshold.
+    Only the sketch and the flagged rows are held in memory.
+    """
+    keys = _group_keys(by)
+    sketch = QuantileSketch(keys, relative_accuracy)
+    for chunk in _read_chunks(source, chunksize):
+        sketch.update(chunk)
+    if sketch.counts is None:
+        return pd.DataFrame()
+    thresholds = sketch.quantile(q)
+
+    flagged = []
+    for chunk in _read_chunks(source, chunksize):
+        costprice = pd.to_numeric(chunk['costprice'], errors='coerce')
+        flagged.append(chunk[costprice > _thresholds_for(chunk, thresholds, keys)])
+    return pd.concat(flagged, ignore_index=True)
+
 
-def flag_rows(df: pd.DataFrame):
-    cost_price = df[['costprice']]
-    cost_outliers = cost_price[cost_price['costprice'] > cost_price.quantile(0.99)[0]]
+def _read_chunks(source, chunksize: int):
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return pd.read_csv(source, chunksize=chunksize)
 
-    return df.loc[cost_outliers.index]
 
 def remove_bars(df: pd.DataFrame):
-    return df[df['srvcrsname'] != 'Bars']
\ No newline at end of file
+    return df[df['srvcrsname'] != 'Bars']
@@ -3,68 +3,179 @@ from io import BytesIO
 import pandas as pd
 import xlsxwriter
 
+from aggregate_store import AggregateStore, daily_over_production, frame_fingerprint
+from instrumentation import stage
+from styles import format_registry, workbook_options, write_table
+
+
+CATEGORY_ORDER = ["Reused", "Waste", "Donated", "Over Production"]
+
+# Block colours (title band, table header, data rows) for each hall
+HALL_COLORS = {
+    "EVK": {"color_main": "#D9D9D9", "color_header": "#FFD965", "color_data": "#FFF2CC"},
+    "IRC": {"color_main": "#FDEADA", "color_header": "#F4B183", "color_data": "#FCE4D6"},
+    "UV": {"color_main": "#E4F4EA", "color_header": "#9DC3E6", "color_data": "#DEEAF6"},
+}
+# Cycled through for any other unit (retail, catering, ...)
+EXTRA_HALL_COLORS = [
+    {"color_main": "#EDE7F6", "color_header": "#B39DDB", "color_data": "#F3EFFA"},
+    {"color_main": "#E0F2F1", "color_header": "#80CBC4", "color_data": "#EEF8F7"},
+    {"color_main": "#FFF8E1", "color_header": "#FFD54F", "color_data": "#FFFBEF"},
+    {"color_main": "#FBE9E7", "color_header": "#FFAB91", "color_data": "#FDF3F1"},
+]
+
+
+def combine_halls(*frames, hall_column: str = "hall"):
+    """
+    Normalise the inputs of generate_report into one long frame plus the hall order.
+
+    Accepts the EVK, IRC and UV frames positionally, a single dict mapping hall
+    label to frame, or a single long frame that already has ``hall_column``.
+    Only the columns the report needs are copied.
+    """
+    columns = ["srvcrsname", "Total_Cost", "eventdate"]
+    if len(frames) == 1 and isinstance(frames[0], pd.DataFrame):
+        long_df = frames[0][[hall_column] + columns]
+        halls = list(pd.unique(long_df[hall_column].dropna()))
+        return long_df, halls
+
+    if len(frames) == 1 and isinstance(frames[0], dict):
+        hall_frames = frames[0]
+    elif len(frames) == len(HALL_COLORS):
+        hall_frames = dict(zip(HALL_COLORS, frames))
+    else:
+        raise ValueError(
+            f"Expected {len(HALL_COLORS)} hall frames, a dict of hall frames or one frame with a "
+            f"'{hall_column}' column, got {len(frames)} arguments"
+        )
+
+    halls = list(hall_frames)
+    long_df = pd.concat(
+        [df[columns] for df in hall_frames.values()],
+        keys=halls, names=[hall_column, None],
+    ).reset_index(level=0)
+    return long_df, halls
+
+
+def create_hall_pivots(long_df: pd.DataFrame, halls, hall_column: str = "hall"):
+    """
+    Over production cost by category for every hall from one grouped aggregation.
+
+    Returns a frame indexed by CATEGORY_ORDER with one column per hall, rounded
+    to cents the same way the per-hall tables are. A category a hall never
+    reported counts as zero.
+    """
+    rows = long_df[long_df["srvcrsname"].str.startswith("**", na=False)]
+    categories = rows["srvcrsname"].str.replace("**", "", regex=False)
+    costs = rows.groupby([categories, rows[hall_column]], observed=True)["Total_Cost"].sum()
+    return pivot_category_costs(costs, halls)
+
+
+def pivot_category_costs(costs: pd.Series, halls):
+    """Turn Total_Cost indexed by (category, hall) into the rounded CATEGORY_ORDER x hall table."""
+    costs = costs.unstack(level=1, fill_value=0).rename(index={"Thrown": "Waste"})
+    costs = costs.groupby(level=0).sum().reindex(columns=halls, fill_value=0)
+    costs.loc["Over Production"] = costs.sum()
+    return costs.round(2).reindex(CATEGORY_ORDER, fill_value=0)
+
+
+def hall_pivot_table(hall_pivots: pd.DataFrame, label: str):
+    """The Category / Over Production / Percentage table of a single hall."""
+    costs = hall_pivots[label]
+    return pd.DataFrame({
+        label: CATEGORY_ORDER,
+        "Over Production": costs.values,
+        "Percentage": (costs / costs.loc["Over Production"]).round(2).fillna(0).values,
+    })
+
 
 def create_report_pivot_table(df: pd.DataFrame, label: str):
-    df.dropna(subset=['srvcrsname'], inplace=True)
-    over_production_df = df[df['srvcrsname'].str.startswith("**")]
-    pivot_over_production_df = over_production_df.pivot_table(
-        index='srvcrsname', values='Total_Cost', aggfunc='sum'
-    )
-    pivot_over_production_df.loc['Over Production'] = pivot_over_production_df.sum()
-    pivot_over_production_df.index = pivot_over_production_df.index.str.replace("**", "")
-    pivot_df = pivot_over_production_df.round(2)
-    pivot_df['Percentage'] = round(
-        pivot_df['Total_Cost'] / pivot_df.loc['Over Production']['Total_Cost'], 2
-    )
-    pivot_df = pivot_df[["Total_Cost", "Percentage"]]
-    pivot_df = pivot_df.rename(columns={"Total_Cost": "Over Production"})
-    pivot_df.index.name = label
-    pivot_df.reset_index(inplace=True)
-    pivot_df[label] = pivot_df[label].replace({"Thrown": "Waste"})
-    desired_order = ["Reused", "Waste", "Donated", "Over Production"]
-    pivot_df = pivot_df.set_index(label).reindex(desired_order).reset_index()
-    return pivot_df
-
-
-def generate_exec_summary(evk_pivot, irc_pivot, uv_pivot):
+    long_df, halls = combine_halls({label: df})
+    return hall_pivot_table(create_hall_pivots(long_df, halls), label)
+
+
+def generate_exec_summary(hall_pivots: pd.DataFrame):
     summary = pd.DataFrame()
-    summary["Over Production"] = (
-            evk_pivot.iloc[:, 1] + irc_pivot.iloc[:, 1] + uv_pivot.iloc[:, 1]
-    )
-    summary.index = ["Reused", "Waste", "Donated", "Over Production"]
-    summary["Percentage"] = summary["Over Production"] / summary.loc["Over Production", "Over Production"]
+    summary["Over Production"] = hall_pivots.sum(axis=1)
+    summary.index = CATEGORY_ORDER
+    summary["Percentage"] = (
+        summary["Over Production"] / summary.loc["Over Production", "Over Production"]
+    ).fillna(0)
     summary.reset_index(inplace=True)
     return summary
 
 
-def generate_report(evk_df: pd.DataFrame, irc_df: pd.DataFrame, uv_df: pd.DataFrame):
-    # Convert eventdate to datetime
-    for df in [evk_df, irc_df, uv_df]:
-        df["eventdate"] = pd.to_datetime(df["eventdate"], errors="coerce")
+def update_store(store: AggregateStore, long_df: pd.DataFrame, halls, hall_column: str = "hall"):
+    """Save each hall's daily over production costs, skipping halls whose rows are already stored."""
+    for hall in halls:
+        hall_rows = long_df[long_df[hall_column] == hall].drop(columns=hall_column)
+        fingerprint = frame_fingerprint(hall_rows)
+        if store.known(hall, "over_production", fingerprint) is None:
+            store.save(hall, "over_production", daily_over_production(hall_rows), fingerprint)
 
-    min_date = min(evk_df["eventdate"].min(), irc_df["eventdate"].min(), uv_df["eventdate"].min())
-    max_date = max(evk_df["eventdate"].max(), irc_df["eventdate"].max(), uv_df["eventdate"].max())
-    date_range_string = f"{min_date.strftime('%m/%d/%Y')} - {max_date.strftime('%m/%d/%Y')}"
 
-    # Create pivot tables and the executive summary
-    evk_pivot = create_report_pivot_table(evk_df, "EVK")
-    irc_pivot = create_report_pivot_table(irc_df, "IRC")
-    uv_pivot = create_report_pivot_table(uv_df, "UV")
-    exec_summary = generate_exec_summary(evk_pivot, irc_pivot, uv_pivot)
+def generate_report(*frames, hall_column: str = "hall", constant_memory: bool = False,
+                    store: AggregateStore = None):
+    """
+    Build the monthly over production workbook.
+
+    ``frames`` is the EVK, IRC and UV frames, a dict of hall label to frame, or
+    one long frame with a ``hall_column``; see combine_halls. With a ``store``,
+    the daily costs of each hall are also saved for later roll-ups.
+    """
+    with stage("monthly.aggregate") as record:
+        long_df, halls = combine_halls(*frames, hall_column=hall_column)
+        record["rows"] = len(long_df)
+        if store is not None:
+            update_store(store, long_df, halls, hall_column)
+
+        # Convert eventdate to datetime
+        event_dates = pd.to_datetime(long_df["eventdate"], errors="coerce")
+        min_date = event_dates.min()
+        max_date = event_dates.max()
+
+        # Create pivot tables and the executive summary
+        hall_pivots = create_hall_pivots(long_df, halls, hall_column)
+
+    with stage("monthly.render", rows=hall_pivots.size):
+        return render_report(hall_pivots, min_date, max_date, constant_memory)
+
+
+def generate_report_from_store(store: AggregateStore, start=None, end=None, halls=None,
+                               constant_memory: bool = False):
+    """Build the monthly workbook by rolling up the stored days in [start, end] instead of raw exports."""
+    with stage("monthly.store_rollup"):
+        halls = list(halls or store.halls("over_production"))
+        stored_range = store.date_range("over_production", start, end, halls)
+        if stored_range is None:
+            raise ValueError(f"No stored over production days between {start} and {end}")
+
+        hall_pivots = pivot_category_costs(store.over_production_costs(start, end, halls), halls)
+
+    with stage("monthly.render", rows=hall_pivots.size):
+        return render_report(hall_pivots, *stored_range, constant_memory)
+
+
+def render_report(hall_pivots: pd.DataFrame, min_date, max_date, constant_memory: bool = False):
+    """Write the summary sheet for a CATEGORY_ORDER x hall cost table and return the workbook bytes."""
+    halls = list(hall_pivots.columns)
+    date_range_string = f"{min_date.strftime('%m/%d/%Y')} - {max_date.strftime('%m/%d/%Y')}"
+    exec_summary = generate_exec_summary(hall_pivots)
 
     output = BytesIO()
-    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+    workbook = xlsxwriter.Workbook(output, workbook_options(constant_memory))
     worksheet = workbook.add_worksheet("Over Production Summary")
+    formats = format_registry(workbook)
 
     # -----------------------------
     # Header and Subheader
     # -----------------------------
-    header_format = workbook.add_format({'font_size': 14, 'font_color': 'white', 'bg_color': '#7B1FA2'})
+    header_format = formats.get({'font_size': 14, 'font_color': 'white', 'bg_color': '#7B1FA2'})
     worksheet.merge_range(0, 0, 0, 7,
                           f"USC Hospitality - Over Production Monthly Summary ({date_range_string})",
                           header_format)
 
-    subheader_format = workbook.add_format(
+    subheader_format = formats.get(
         {'font_size': 18, 'bg_color': '#DCE6F1', 'align': 'center', 'valign': 'vcenter'})
     worksheet.merge_range(1, 0, 1, 7, "Residential (All units)", subheader_format)
 
@@ -80,23 +191,16 @@ def generate_report(evk_df: pd.DataFrame, irc_df: pd.DataFrame, uv_df: pd.DataFr
     # Executive Summary Block (with chart)
     # -----------------------------
     exec_start = 3
-    exec_hdr_fmt = workbook.add_format({'align': 'center', 'bg_color': '#2F75B5', 'font_color': 'white'})
-    worksheet.write_row(exec_start, 0, ["Category", "Total", "Percentage"], exec_hdr_fmt)
-    row = exec_start + 1
-    data_fmt = workbook.add_format({'bg_color': '#DCE6F1'})
-    data_cur = workbook.add_format({'num_format': '"$"#,##0.00', 'bg_color': '#DCE6F1'})
-    data_pct = workbook.add_format({'num_format': '0%', 'bg_color': '#DCE6F1'})
-    for tup in exec_summary.itertuples(index=False):
-        cat, tot, pct = tup
-        if cat == "Over Production":
-            worksheet.write(row, 0, cat)
-            worksheet.write(row, 1, tot, workbook.add_format({'num_format': '"$"#,##0.00'}))
-            worksheet.write(row, 2, pct, workbook.add_format({'num_format': '0%'}))
-        else:
-            worksheet.write(row, 0, cat, data_fmt)
-            worksheet.write(row, 1, tot, data_cur)
-            worksheet.write(row, 2, pct, data_pct)
-        row += 1
+    exec_hdr_fmt = formats.get({'align': 'center', 'bg_color': '#2F75B5', 'font_color': 'white'})
+    total_cur = formats.get(num_format='"$"#,##0.00')
+    total_pct = formats.get(num_format='0%')
+    data_fmt = formats.get(bg_color='#DCE6F1')
+    data_cur = formats.get(num_format='"$"#,##0.00', bg_color='#DCE6F1')
+    data_pct = formats.get(num_format='0%', bg_color='#DCE6F1')
+    # Category rows first, the "Over Production" total row last
+    row = write_table(worksheet, exec_start, 0, exec_summary.set_axis(["Category", "Total", "Percentage"], axis=1),
+                      {"Category": data_fmt, "Total": data_cur, "Percentage": data_pct}, header_format=exec_hdr_fmt,
+                      total_formats={"Total": total_cur, "Percentage": total_pct})
     exec_end = row - 1
 
     # Insert Executive Summary Doughnut Chart (no slice labels)
@@ -116,36 +220,25 @@ def generate_report(evk_df: pd.DataFrame, irc_df: pd.DataFrame, uv_df: pd.DataFr
     current_row = exec_end + 10
 
     # -----------------------------
-    # Function to write a detailed hall block (for EVK, IRC, or UV)
+    # Function to write a detailed hall block
     # -----------------------------
     def write_block(title, pivot_df, start_row, color_main, color_header, color_data):
         # Title band for the block
-        block_fmt = workbook.add_format(
+        block_fmt = formats.get(
             {'font_size': 18, 'bg_color': color_main, 'align': 'center', 'valign': 'vcenter'})
         worksheet.merge_range(start_row, 0, start_row, 7, title, block_fmt)
         start_row += 1
 
-        # Table header
-        hdr_fmt = workbook.add_format({'align': 'center', 'bg_color': color_header})
-        worksheet.write_row(start_row, 0, ["Category", "Cost", "Percentage"], hdr_fmt)
-        start_row += 1
+        # Table header, category rows and the total row
+        hdr_fmt = formats.get({'align': 'center', 'bg_color': color_header})
+        d_fmt = formats.get(bg_color=color_data)
+        d_cur = formats.get(num_format='"$"#,##0.00', bg_color=color_data)
+        d_pct = formats.get(num_format='0%', bg_color=color_data)
 
-        data_start = start_row
-        d_fmt = workbook.add_format({'bg_color': color_data})
-        d_cur = workbook.add_format({'num_format': '"$"#,##0.00', 'bg_color': color_data})
-        d_pct = workbook.add_format({'num_format': '0%', 'bg_color': color_data})
-
-        for row_data in pivot_df.itertuples(index=False):
-            cat, cost, pct = row_data
-            if cat == "Over Production":
-                worksheet.write(start_row, 0, cat)
-                worksheet.write(start_row, 1, cost, workbook.add_format({'num_format': '"$"#,##0.00'}))
-                worksheet.write(start_row, 2, pct, workbook.add_format({'num_format': '0%'}))
-            else:
-                worksheet.write(start_row, 0, cat, d_fmt)
-                worksheet.write(start_row, 1, cost, d_cur)
-                worksheet.write(start_row, 2, pct, d_pct)
-            start_row += 1
+        data_start = start_row + 1
+        start_row = write_table(worksheet, start_row, 0, pivot_df.set_axis(["Category", "Cost", "Percentage"], axis=1),
+                                {"Category": d_fmt, "Cost": d_cur, "Percentage": d_pct}, header_format=hdr_fmt,
+                                total_formats={"Cost": total_cur, "Percentage": total_pct})
         data_end = start_row - 1
 
         # Create a smaller doughnut chart for this block (no slice labels)
@@ -167,35 +260,15 @@ def generate_report(evk_df: pd.DataFrame, irc_df: pd.DataFrame, uv_df: pd.DataFr
     # -----------------------------
     # Detailed Breakdown Blocks (for each hall)
     # -----------------------------
-    # EVK Block
-    current_row = write_block(
-        "EVK Breakdown",
-        evk_pivot,
-        current_row,
-        color_main="#D9D9D9",
-        color_header="#FFD965",
-        color_data="#FFF2CC"
-    )
-
-    # IRC Block
-    current_row = write_block(
-        "IRC Breakdown",
-        irc_pivot,
-        current_row,
-        color_main="#FDEADA",
-        color_header="#F4B183",
-        color_data="#FCE4D6"
-    )
-
-    # UV Block
-    current_row = write_block(
-        "UV Breakdown",
-        uv_pivot,
-        current_row,
-        color_main="#E4F4EA",
-        color_header="#9DC3E6",
-        color_data="#DEEAF6"
-    )
+    extra_colors = iter(EXTRA_HALL_COLORS * (len(halls) // len(EXTRA_HALL_COLORS) + 1))
+    for hall in halls:
+        colors = HALL_COLORS.get(hall) or next(extra_colors)
+        current_row = write_block(
+            f"{hall} Breakdown",
+            hall_pivot_table(hall_pivots, hall),
+            current_row,
+            **colors
+        )
 
     workbook.close()
     output.seek(0)
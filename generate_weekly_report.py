@@ -1,149 +1,261 @@
+from io import BytesIO
+
+import numpy as np
 import pandas as pd
 import xlsxwriter
 
+from aggregate_store import AggregateStore, frame_fingerprint
+from ingest import file_hash
+from instrumentation import stage
+from schema import WEEKLY_COLUMNS, read_export_csv
+from styles import format_registry, workbook_options, write_table
+
+
+OVER_PRODUCTION_CATEGORIES = ['**Donated', '**Reused', '**Thrown']
+SUMMARY_COLUMNS = ['Date', 'pre_service_cust_count', 'post_service_customer_count',
+                   'pre_service_total_cost', 'post_service_total_cost', 'revenue']
+
+# Sheet headers of the daily table's columns
+DAILY_HEADERS = {'Day': 'Day', 'Date': 'Date', 'pre_service_cust_count': 'Pre-Service Customer Count',
+                 'post_service_customer_count': 'Post-Service Customer Count',
+                 'pre_service_total_cost': 'Pre-Service Total Cost',
+                 'post_service_total_cost': 'Post-Service (Prepped) Total',
+                 'total_cost_variance': 'Total Cost Variance'}
+# Cost variances at or below this are shaded red, the rest green
+VARIANCE_THRESHOLD = -0.1
+
+# Rows per chunk when streaming a CSV export
+DEFAULT_CHUNKSIZE = 200_000
+
+
+def _numeric(series: pd.Series):
+    # No-op for frames typed by schema.read_export_*; coerces raw text otherwise
+    series = pd.to_numeric(series, errors='coerce')
+    return series.fillna(0) if series.hasnans else series
+
+
+def _count(series: pd.Series):
+    # Downcast counts are widened again before anything sums them, or int8/int16 sums would overflow
+    return series.astype('int64') if pd.api.types.is_integer_dtype(series) else series
 
-def add_report(data: pd.DataFrame, output: xlsxwriter.Workbook, worksheet):
-    # Remove rows where 'srvcrsname' is in ['**Donated', '**Reused', '**Thrown']
-    filtered_data = data[~data['srvcrsname'].isin(['**Donated', '**Reused', '**Thrown'])]
 
+def is_revenue(itemname):
+    """True where an item name (Series or Index) starts with 'RES _REVENUE_'; blank names are not revenue."""
+    return np.asarray(itemname.str.startswith('RES _REVENUE_', na=False), dtype=bool)
+
+
+def prepare_service_rows(data: pd.DataFrame):
+    """
+    The rows and columns the weekly metrics need, as a new frame.
+
+    ``data`` is not modified, and only the selected rows of the needed columns
+    are copied.
+    """
     # Convert 'eventdate' to datetime format and handle errors
-    filtered_data['eventdate'] = pd.to_datetime(filtered_data['eventdate'], errors='coerce')
+    eventdate = data['eventdate']
+    if not pd.api.types.is_datetime64_any_dtype(eventdate):
+        eventdate = pd.to_datetime(eventdate, errors='coerce')
 
-    # Drop rows where 'eventdate' could not be converted
-    filtered_data = filtered_data.dropna(subset=['eventdate'])
+    # Remove rows where 'srvcrsname' is in ['**Donated', '**Reused', '**Thrown'] or 'eventdate' could not be converted
+    keep = (~data['srvcrsname'].isin(OVER_PRODUCTION_CATEGORIES) & eventdate.notna()).to_numpy()
 
     # Convert necessary columns to numeric and handle missing values
-    filtered_data['fcst_prtncount'] = pd.to_numeric(filtered_data['fcst_prtncount'], errors='coerce').fillna(0)
-    filtered_data['served_prtncount'] = pd.to_numeric(filtered_data['served_prtncount'], errors='coerce').fillna(0)
-    filtered_data['costprice'] = pd.to_numeric(filtered_data['costprice'], errors='coerce').fillna(0)
-
-    # Create new columns for cost calculations
-    filtered_data['pre_service_cost'] = filtered_data['fcst_prtncount'] * filtered_data['costprice']
-    filtered_data['post_service_cost'] = filtered_data['served_prtncount'] * filtered_data['costprice']
-
-    # Group by date with unique customer counts
-    unique_fcst_custcount_sum = (
-        filtered_data.drop_duplicates(subset=['eventdate', 'fcst_custcount'])
-        .groupby(filtered_data['eventdate'].dt.date)['fcst_custcount'].sum()
-    )
-    unique_sold_custcount_sum = (
-        filtered_data.drop_duplicates(subset=['eventdate', 'sold_custcount'])
-        .groupby(filtered_data['eventdate'].dt.date)['sold_custcount'].sum()
-    )
-
-    # Aggregate other metrics by date
-    summary = filtered_data.groupby(filtered_data['eventdate'].dt.date).agg(
-        pre_service_total_cost=('pre_service_cost', 'sum'),
-        post_service_total_cost=('post_service_cost', 'sum')
-    ).reset_index()
-
-    # Merge with the unique customer counts
-    summary = summary.merge(unique_fcst_custcount_sum, on='eventdate', how='left')
-    summary = summary.merge(unique_sold_custcount_sum, on='eventdate', how='left')
-
-    # Calculate revenue from rows with item names starting with 'RES _REVENUE_'
-    revenue_data = filtered_data[filtered_data['itemname'].str.startswith('RES _REVENUE_')]
-    revenue_summary = revenue_data.groupby(revenue_data['eventdate'].dt.date).agg(
-        revenue=('sold_prtncount', 'sum')
-    ).reset_index()
-
-    # Merge revenue data into the summary
-    summary = pd.merge(summary, revenue_summary, on='eventdate', how='left').fillna(0)
-
-    # Rename columns for clarity
-    summary.rename(columns={
-        'eventdate': 'Date',
-        'fcst_custcount': 'pre_service_cust_count',
-        'sold_custcount': 'post_service_customer_count'
-    }, inplace=True)
-
-    summary = summary[
-        ['Date', 'pre_service_cust_count', 'post_service_customer_count',
-         'pre_service_total_cost', 'post_service_total_cost', 'revenue']
-    ]
+    costprice = _numeric(data['costprice'][keep])
+    return pd.DataFrame({
+        'eventdate': eventdate[keep],
+        'itemname': data['itemname'][keep],
+        'sold_prtncount': _count(data['sold_prtncount'][keep]),
+        'fcst_custcount': _count(data['fcst_custcount'][keep]),
+        'sold_custcount': _count(data['sold_custcount'][keep]),
+        # Cost calculations
+        'pre_service_cost': _numeric(data['fcst_prtncount'][keep]) * costprice,
+        'post_service_cost': _numeric(data['served_prtncount'][keep]) * costprice,
+    })
+
+
+def summarize_daily(data: pd.DataFrame):
+    """Per-day customer counts, pre/post-service costs and revenue for one hall's export."""
+    return summarize_service_rows(prepare_service_rows(data))
+
+
+def summarize_service_rows(filtered_data: pd.DataFrame):
+    """summarize_daily for rows already passed through prepare_service_rows (e.g. a window of index_by_date)."""
+    # Customer counts repeat on every item row of a meal; only the first row of each
+    # (eventdate, count) pair contributes, which is what drop_duplicates + sum did before.
+    first_fcst = ~filtered_data.duplicated(subset=['eventdate', 'fcst_custcount'])
+    first_sold = ~filtered_data.duplicated(subset=['eventdate', 'sold_custcount'])
+
+    # Revenue comes from rows with item names starting with 'RES _REVENUE_'
+    revenue_rows = is_revenue(filtered_data['itemname'])
+
+    # One grouped aggregation over all daily metrics
+    metrics = pd.DataFrame({
+        'pre_service_cust_count': filtered_data['fcst_custcount'].where(first_fcst, 0),
+        'post_service_customer_count': filtered_data['sold_custcount'].where(first_sold, 0),
+        'pre_service_total_cost': filtered_data['pre_service_cost'],
+        'post_service_total_cost': filtered_data['post_service_cost'],
+        'revenue': filtered_data['sold_prtncount'].where(revenue_rows, 0),
+    })
+    summary = metrics.groupby(filtered_data['eventdate'].dt.normalize().to_numpy()).sum()
+
+    summary.index = pd.Index(summary.index.date, name='Date')
+    return summary.reset_index()[SUMMARY_COLUMNS]
+
+
+def _fold_distinct(pairs, rows: pd.DataFrame, column: str):
+    # Distinct (eventdate, count) pairs seen so far; bounded by days x meal periods, not rows
+    chunk_pairs = rows[['eventdate', column]].drop_duplicates()
+    if pairs is None:
+        return chunk_pairs
+    return pd.concat([pairs, chunk_pairs], ignore_index=True).drop_duplicates()
+
+
+def _fold_sum(running, partial):
+    return partial if running is None else running.add(partial, fill_value=0)
+
+
+def summarize_daily_csv(source, chunksize: int = DEFAULT_CHUNKSIZE):
+    """
+    Streaming equivalent of summarize_daily for a CSV export.
+
+    The file is read ``chunksize`` rows at a time and each chunk is folded into
+    running per-date aggregates, so peak memory depends on the number of days
+    rather than the number of rows. Counts and revenue match the in-memory path
+    exactly; cost sums match up to floating point summation order.
+    """
+    costs = fcst_pairs = sold_pairs = revenue = None
+    for chunk in read_export_csv(source, WEEKLY_COLUMNS, chunksize=chunksize):
+        rows = prepare_service_rows(chunk)
+        if rows.empty:
+            continue
+        dates = rows['eventdate'].dt.date
+        costs = _fold_sum(costs, rows.groupby(dates)[['pre_service_cost', 'post_service_cost']].sum())
+        fcst_pairs = _fold_distinct(fcst_pairs, rows, 'fcst_custcount')
+        sold_pairs = _fold_distinct(sold_pairs, rows, 'sold_custcount')
+
+        revenue_rows = rows[is_revenue(rows['itemname'])]
+        revenue = _fold_sum(revenue, revenue_rows.groupby(dates[revenue_rows.index])['sold_prtncount'].sum())
+
+    if costs is None:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS)
+
+    costs = costs.sort_index()
+    summary = pd.DataFrame({
+        'pre_service_cust_count': fcst_pairs.groupby(fcst_pairs['eventdate'].dt.date)['fcst_custcount'].sum(),
+        'post_service_customer_count': sold_pairs.groupby(sold_pairs['eventdate'].dt.date)['sold_custcount'].sum(),
+        'pre_service_total_cost': costs['pre_service_cost'],
+        'post_service_total_cost': costs['post_service_cost'],
+        'revenue': revenue,
+    }, index=costs.index).fillna(0)
+    summary.index.name = 'Date'
+    return summary.reset_index()[SUMMARY_COLUMNS]
+
+
+def stored_summary(store: AggregateStore, hall: str, fingerprint: str, compute):
+    """Daily summary of ``hall`` from the store if this exact data was saved before, else ``compute()`` and save."""
+    stored_range = store.known(hall, 'service', fingerprint)
+    if stored_range is not None:
+        return store.service_summary(hall, *stored_range)
+    summary = compute()
+    store.save(hall, 'service', summary.rename(columns={'Date': 'date'}), fingerprint)
+    return summary
+
+
+def finish_summary(summary: pd.DataFrame):
+    """Append the totals row and derived columns; returns the daily table and the revenue table."""
+    totals = summary[SUMMARY_COLUMNS[1:]].sum()
+    totals_row = pd.DataFrame([{'Date': 'Totals:', **totals.to_dict()}])
+    summary = pd.concat([summary, totals_row], ignore_index=True)
 
-    summary.loc[len(summary)] = ['Totals:', summary['pre_service_cust_count'].sum(),
-                                 summary['post_service_customer_count'].sum(),
-                                 summary['pre_service_total_cost'].sum(),
-                                 summary['post_service_total_cost'].sum(), summary['revenue'].sum()]
-    summary.loc[len(summary) - 1, 'Date'] = 'Totals:'
-    summary.loc[len(summary) - 1, 'pre_service_cust_count'] = summary.loc[len(summary) - 1, 'pre_service_cust_count']
-    summary.loc[len(summary) - 1, 'post_service_customer_count'] = summary.loc[
-        len(summary) - 1, 'post_service_customer_count']
-    summary.loc[len(summary) - 1, 'pre_service_total_cost'] = summary.loc[len(summary) - 1, 'pre_service_total_cost']
-    summary.loc[len(summary) - 1, 'post_service_total_cost'] = summary.loc[len(summary) - 1, 'post_service_total_cost']
-    summary.loc[len(summary) - 1, 'revenue'] = summary.loc[len(summary) - 1, 'revenue']
     summary['total_cost_variance'] = (summary['post_service_total_cost'] - summary['pre_service_total_cost']) / summary[
         'pre_service_total_cost']
-    summary['Day'] = summary['Date'].map(lambda x: pd.Timestamp(x).day_name() if x != 'Totals:' else 'Totals:')
+    day_names = pd.to_datetime(summary['Date'].iloc[:-1]).dt.day_name()
+    summary['Day'] = pd.concat([day_names, pd.Series(['Totals:'], index=[len(summary) - 1])])
 
-    revenue_table = summary[['revenue']][:-1].copy()
-    revenue_table.loc[len(revenue_table)] = revenue_table['revenue'].sum()
+    revenue_table = summary[['revenue']].copy()
     revenue_table['sales_per_person'] = summary['revenue'] / summary['post_service_customer_count']
     revenue_table['cost_per_person'] = summary['post_service_total_cost'] / summary['post_service_customer_count']
     revenue_table['margin'] = revenue_table['sales_per_person'] - revenue_table['cost_per_person']
     revenue_table['margin_percentage'] = revenue_table['cost_per_person'] / revenue_table['sales_per_person']
 
-    summary_table_to_write = summary[['Day', 'Date', 'pre_service_cust_count', 'post_service_customer_count',
-                                      'pre_service_total_cost', 'post_service_total_cost', 'total_cost_variance']]
+    return summary, revenue_table
+
+
+def _cents(series: pd.Series):
+    # Python's round, as the sheets have always used; Series.round sends some half-cent sums the other way
+    return series.map(lambda value: round(value, 2))
 
-    title_format = output.add_format(
+
+def _short_date(day) -> str:
+    return f"{day.month}/{day.day}/{day.year}"
+
+
+def period_labels(start, end):
+    """
+    The sheet subtitle and revenue heading for the period [start, end].
+
+    A Monday-to-Sunday period is also numbered as the week of the month its
+    Sunday falls in, so 3/31/2025 - 4/6/2025 is "Week 1" of April.
+    """
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    span = f"{_short_date(start)} to {_short_date(end)}"
+    heading = f"Report Period  {_short_date(start)} - {_short_date(end)}"
+    if start.dayofweek == 0 and (end - start).days == 6:
+        week = f"Week {(end.day - 1) // 7 + 1}"
+        return f" ({span}) - {week}", f"{heading} - {week}"
+    return f" ({span})", heading
+
+
+def write_report(summary: pd.DataFrame, revenue_table: pd.DataFrame, output: xlsxwriter.Workbook, worksheet,
+                 period=None):
+    """
+    Write one hall's weekly sheet. ``period`` is the (start, end) the report
+    covers; without it the first and last day in ``summary`` are used.
+    """
+    formats = format_registry(output)
+    if period is None:
+        days = summary['Date'].iloc[:-1]
+        period = (days.min(), days.max()) if len(days) else (None, None)
+    subtitle, revenue_heading = period_labels(*period) if period[0] is not None else ('', '')
+
+    title_format = formats.get(
         {'bold': True, 'font_size': 18, 'align': 'center', 'valign': 'vcenter', 'italic': True, 'font_name': 'Arial',
          'border': 1, 'bottom': 1})
     worksheet.merge_range('A1:G1', 'Pre-Post Service Cost Summary', title_format)
-    worksheet.set_row(0, 30)  # Set the height of the first row
+    worksheet.set_row_pixels(0, 31)  # Set the height of the first row
 
-    subtitle_format = output.add_format(
+    subtitle_format = formats.get(
         {'bold': True, 'font_size': 11, 'align': 'center', 'valign': 'vcenter', 'font_name': 'Calibri', 'border': 1})
-    worksheet.merge_range('A2:F2', ' (3/31/2025 to 4/6/2025) - Week 1', subtitle_format)
+    worksheet.merge_range('A2:F2', subtitle, subtitle_format)
     worksheet.set_row(1, 20)  # Set the height of the second row
 
-    header_format = output.add_format(
-        {'font_size': 8, 'align': 'center', 'valign': 'vcenter', 'border': 1, 'font_name': 'Arial',
-         'bg_color': '#D9D9D9', 'italic': True, 'text_wrap': True})
-    data_format = output.add_format(
-        {'font_size': 8, 'align': 'center', 'valign': 'vcenter', 'border': 1, 'font_name': 'Arial',
-         'num_format': '#,##0'})
-    bold_data_format = output.add_format(
-        {'font_size': 8, 'align': 'center', 'valign': 'vcenter', 'border': 1, 'font_name': 'Arial',
-         'num_format': '#,##0',
-         'bold': True})
-    amount_format = output.add_format(
-        {'font_size': 8, 'align': 'center', 'valign': 'vcenter', 'border': 1, 'font_name': 'Arial',
-         'num_format': '$#,##0.00'})
-    bold_amount_format = output.add_format(
-        {'font_size': 8, 'align': 'center', 'valign': 'vcenter', 'border': 1, 'font_name': 'Arial', 'bold': True,
-         'num_format': '$#,##0.00'})
-    percent_format = output.add_format(
-        {'font_size': 8, 'align': 'center', 'valign': 'vcenter', 'border': 1, 'font_name': 'Arial',
-         'num_format': '0%'})
-    headers = ['Day', 'Date', 'Pre-Service Customer Count', 'Post-Service Customer Count',
-               'Pre-Service Total Cost', 'Post-Service (Prepped) Total', 'Total Cost Variance']
-    worksheet.write_row('A3', headers, header_format)
-    for row_num, row_data in enumerate(summary_table_to_write.values, start=3):
-        if row_data[0] == 'Totals:':
-            worksheet.merge_range(row_num, 0, row_num, 1, row_data[0], output.add_format(
-                {'font_size': 8, 'align': 'left', 'valign': 'vcenter', 'border': 1, 'font_name': 'Arial',
-                 'bold': True}))
-            worksheet.write(row_num, 2, row_data[2], bold_data_format)
-            worksheet.write(row_num, 3, row_data[3], bold_data_format)
-            worksheet.write(row_num, 4, round(row_data[4], 2), bold_amount_format)
-            worksheet.write(row_num, 5, round(row_data[5], 2), bold_amount_format)
-            bg_color = '#FFC7CE' if row_data[6] <= -0.1 else '#C6EFCE'
-            worksheet.write(row_num, 6, row_data[6], output.add_format(
-                {'font_size': 8, 'align': 'center', 'valign': 'vcenter', 'border': 1, 'font_name': 'Arial',
-                 'num_format': '0%', 'bg_color': bg_color}))
-        else:
-            worksheet.write(row_num, 0, row_data[0], data_format)
-            worksheet.write(row_num, 1, row_data[1].strftime('%m/%d/%Y'), data_format)
-            worksheet.write(row_num, 2, row_data[2], data_format)
-            worksheet.write(row_num, 3, row_data[3], data_format)
-            worksheet.write(row_num, 4, round(row_data[4], 2), amount_format)
-            worksheet.write(row_num, 5, round(row_data[5], 2), amount_format)
-            bg_color = '#FFC7CE' if row_data[6] <= -0.1 else '#C6EFCE'
-            worksheet.write(row_num, 6, row_data[6], output.add_format(
-                {'font_size': 8, 'align': 'center', 'valign': 'vcenter', 'border': 1, 'font_name': 'Arial',
-                 'num_format': '0%', 'bg_color': bg_color}))
+    cell = {'font_size': 8, 'align': 'center', 'valign': 'vcenter', 'border': 1, 'font_name': 'Arial'}
+    header_format = formats.get(cell, bg_color='#D9D9D9', italic=True, text_wrap=True)
+    data_format = formats.get(cell, num_format='#,##0')
+    bold_data_format = formats.get(cell, num_format='#,##0', bold=True)
+    amount_format = formats.get(cell, num_format='$#,##0.00')
+    bold_amount_format = formats.get(cell, num_format='$#,##0.00', bold=True)
+    percent_format = formats.get(cell, num_format='0%')
+    totals_label_format = formats.get(cell, align='left', bold=True)
+    # Red/green variance fill is a conditional format over the whole column
+    variance_rules = [
+        {'type': 'cell', 'criteria': '<=', 'value': VARIANCE_THRESHOLD, 'format': formats.get(bg_color='#FFC7CE')},
+        {'type': 'cell', 'criteria': '>', 'value': VARIANCE_THRESHOLD, 'format': formats.get(bg_color='#C6EFCE')},
+    ]
+
+    # Daily rows, then the totals row with its label merged over Day and Date
+    table = summary[list(DAILY_HEADERS)].assign(pre_service_total_cost=_cents(summary['pre_service_total_cost']),
+                                                post_service_total_cost=_cents(summary['post_service_total_cost']))
+    table = table.rename(columns=DAILY_HEADERS)
+    daily, totals = table.iloc[:-1].copy(), table.iloc[-1:, 2:]
+    daily['Date'] = pd.to_datetime(daily['Date']).dt.strftime('%m/%d/%Y')
+    daily_formats = [data_format] * 4 + [amount_format] * 2 + [percent_format]
+    totals_formats = [bold_data_format] * 2 + [bold_amount_format] * 2 + [percent_format]
+    row_num = write_table(worksheet, 2, 0, daily, dict(zip(table.columns, daily_formats)),
+                          header_format=header_format, conditional={'Total Cost Variance': variance_rules})
+    worksheet.merge_range(row_num, 0, row_num, 1, 'Totals:', totals_label_format)
+    revenue_row = write_table(worksheet, row_num, 2, totals, dict(zip(totals.columns, totals_formats)),
+                              conditional={'Total Cost Variance': variance_rules})
 
     worksheet.set_column_pixels('A:A', 94)
     worksheet.set_column_pixels('B:B', 82)
@@ -153,24 +265,154 @@ def add_report(data: pd.DataFrame, output: xlsxwriter.Workbook, worksheet):
     worksheet.set_column_pixels('F:F', 129)
     worksheet.set_column_pixels('G:G', 64)
 
-    worksheet.set_row_pixels(0, 31)
+    # The revenue table follows the daily table, however many days the period has
+    worksheet.merge_range(revenue_row, 0, revenue_row, 4, revenue_heading, subtitle_format)
+    revenue_table = revenue_table[['revenue', 'sales_per_person', 'cost_per_person', 'margin', 'margin_percentage']]
+    revenue_table = revenue_table.set_axis(['Revenue', 'Sales Per Person', 'Cost Per Person', 'Margin ($)',
+                                            'Margin (%)'], axis=1)
+    write_table(worksheet, revenue_row + 1, 0, revenue_table,
+                dict(zip(revenue_table.columns, [amount_format] * 4 + [percent_format])), header_format=header_format,
+                total_formats=dict(zip(revenue_table.columns, [bold_amount_format] * 4 + [percent_format])))
 
-    worksheet.merge_range('A12:E12', 'Report Period  3/31/2025 - 4/6/2025 - Week 1', subtitle_format)
 
-    worksheet.write_row('A13', ['Revenue', 'Sales Per Person', 'Cost Per Person', 'Margin ($)', 'Margin (%)'],
-                        header_format)
+def add_report(data: pd.DataFrame, output: xlsxwriter.Workbook, worksheet,
+               store: AggregateStore = None, hall: str = None, period=None):
+    with stage('weekly.aggregate', rows=len(data), hall=hall):
+        if store is not None and hall is not None:
+            summary = stored_summary(store, hall, frame_fingerprint(data), lambda: summarize_daily(data))
+        else:
+            summary = summarize_daily(data)
+    with stage('weekly.render', rows=len(summary), hall=hall):
+        summary, revenue_table = finish_summary(summary)
+        write_report(summary, revenue_table, output, worksheet, period)
 
-    for idx, row in enumerate(revenue_table.values, start=13):
-        if idx == len(revenue_table) + 12:
 
-            worksheet.write(idx, 0, row[0], bold_amount_format)
-            worksheet.write(idx, 1, row[1], bold_amount_format)
-            worksheet.write(idx, 2, row[2], bold_amount_format)
-            worksheet.write(idx, 3, row[3], bold_amount_format)
-            worksheet.write(idx, 4, row[4], percent_format)
+def add_report_from_csv(source, output: xlsxwriter.Workbook, worksheet, chunksize: int = DEFAULT_CHUNKSIZE,
+                        store: AggregateStore = None, hall: str = None, period=None):
+    """Bounded-memory variant of add_report that streams ``source`` in chunks."""
+    # Parsing and aggregation are fused in the chunked path, so they are one stage
+    with stage('weekly.ingest_aggregate', hall=hall):
+        if store is not None and hall is not None:
+            summary = stored_summary(store, hall, file_hash(source), lambda: summarize_daily_csv(source, chunksize))
         else:
-            worksheet.write(idx, 0, row[0], amount_format)
-            worksheet.write(idx, 1, row[1], amount_format)
-            worksheet.write(idx, 2, row[2], amount_format)
-            worksheet.write(idx, 3, row[3], amount_format)
-            worksheet.write(idx, 4, row[4], percent_format)
+            summary = summarize_daily_csv(source, chunksize)
+    with stage('weekly.render', rows=len(summary), hall=hall):
+        summary, revenue_table = finish_summary(summary)
+        write_report(summary, revenue_table, output, worksheet, period)
+
+
+def build_weekly_workbook(hall_frames: dict, chunksize: int = None, constant_memory: bool = False,
+                          store: AggregateStore = None, period=None):
+    """
+    Write one add_report sheet per hall (in the given order) and return the workbook bytes.
+
+    With ``chunksize`` set, the values of ``hall_frames`` are CSV paths or buffers
+    that are streamed through add_report_from_csv instead of loaded whole.
+    ``constant_memory`` switches xlsxwriter to its row-streaming mode. With a
+    ``store``, each hall's daily figures are saved, and reused when the same data
+    comes back. ``period`` is the (start, end) the exports cover, for the sheet
+    labels; by default it is the first and last day in each hall's data.
+    """
+    output = BytesIO()
+    workbook = xlsxwriter.Workbook(output, workbook_options(constant_memory))
+    for hall, data in hall_frames.items():
+        worksheet = workbook.add_worksheet(hall)
+        if chunksize:
+            add_report_from_csv(data, workbook, worksheet, chunksize, store=store, hall=hall, period=period)
+        else:
+            add_report(data, workbook, worksheet, store=store, hall=hall, period=period)
+
+    with stage('weekly.save'):
+        workbook.close()
+    output.seek(0)
+    return output
+
+
+def build_weekly_workbook_from_store(store: AggregateStore, start=None, end=None, halls=None,
+                                     constant_memory: bool = False):
+    """Weekly workbook for [start, end] built from stored daily figures, one sheet per hall."""
+    with stage('weekly.store_rollup'):
+        summaries = {hall: store.service_summary(hall, start, end) for hall in halls or store.halls('service')}
+        if all(summary.empty for summary in summaries.values()):
+            raise ValueError(f"No stored service days between {start} and {end}")
+
+    output = BytesIO()
+    workbook = xlsxwriter.Workbook(output, workbook_options(constant_memory))
+    period = (start, end) if start is not None and end is not None else None
+    for hall, summary in summaries.items():
+        with stage('weekly.render', rows=len(summary), hall=hall):
+            summary, revenue_table = finish_summary(summary)
+            write_report(summary, revenue_table, workbook, workbook.add_worksheet(hall), period)
+
+    with stage('weekly.save'):
+        workbook.close()
+    output.seek(0)
+    return output
+
+
+def index_by_date(data: pd.DataFrame):
+    """
+    prepare_service_rows of a long export, sorted by and indexed on the day.
+
+    Costs are computed once for the whole export; any date window is then a
+    binary search on the sorted index (see date_window) instead of a scan.
+    """
+    rows = prepare_service_rows(data)
+    rows.index = pd.DatetimeIndex(rows['eventdate'].dt.normalize(), name='day')
+    # Stable, so rows keep their file order within a day and sums match a pre-cut file exactly
+    return rows.sort_index(kind='stable')
+
+
+def date_window(indexed: pd.DataFrame, start, end):
+    """The rows of an index_by_date frame from ``start`` to ``end``, both days included."""
+    return indexed.loc[pd.Timestamp(start).normalize():pd.Timestamp(end).normalize()]
+
+
+def index_halls(hall_frames, hall_column: str = 'hall'):
+    """
+    index_by_date for every hall: ``hall_frames`` is a dict of hall label to
+    long export, or one long export with a ``hall_column``.
+    """
+    if isinstance(hall_frames, pd.DataFrame):
+        hall_frames = {hall: rows for hall, rows in hall_frames.groupby(hall_column, observed=True, sort=False)}
+    return {hall: index_by_date(data) for hall, data in hall_frames.items()}
+
+
+def iso_weeks(indexed_halls: dict):
+    """(Monday, Sunday) of every ISO week that has data for at least one hall, in order."""
+    days = pd.DatetimeIndex([]).append([indexed.index.unique() for indexed in indexed_halls.values()])
+    mondays = (days - pd.to_timedelta(days.dayofweek, unit='D')).unique().sort_values()
+    return [(monday, monday + pd.Timedelta(days=6)) for monday in mondays]
+
+
+def build_window_workbook(indexed_halls: dict, start, end, constant_memory: bool = False):
+    """
+    Weekly-style workbook for [start, end] with one sheet per hall of an
+    index_halls dict. A hall without rows in the window gets a sheet of zero
+    totals; a window without any rows raises ValueError.
+    """
+    windows = {hall: date_window(indexed, start, end) for hall, indexed in indexed_halls.items()}
+    if all(rows.empty for rows in windows.values()):
+        raise ValueError(f"No rows between {start} and {end}")
+
+    output = BytesIO()
+    workbook = xlsxwriter.Workbook(output, workbook_options(constant_memory))
+    for hall, rows in windows.items():
+        with stage('weekly.aggregate', rows=len(rows), hall=hall):
+            summary = summarize_service_rows(rows)
+        with stage('weekly.render', rows=len(summary), hall=hall):
+            summary, revenue_table = finish_summary(summary)
+            write_report(summary, revenue_table, workbook, workbook.add_worksheet(hall), (start, end))
+
+    with stage('weekly.save'):
+        workbook.close()
+    output.seek(0)
+    return output
+
+
+def build_iso_week_workbooks(hall_frames, constant_memory: bool = False, hall_column: str = 'hall'):
+    """One weekly workbook per ISO week in the data, as {(monday, sunday): buffer}; see index_halls."""
+    with stage('weekly.index'):
+        indexed_halls = index_halls(hall_frames, hall_column)
+    return {week: build_window_workbook(indexed_halls, *week, constant_memory=constant_memory)
+            for week in iso_weeks(indexed_halls)}
@@ -0,0 +1,151 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from columnar_cache import ColumnarCache, available as columnar_cache_available
+from schema import read_export_csv, read_export_excel
+
+HALL_SHEETS = ["EVK", "IRC", "UV"]
+_HALL_PATTERN = re.compile(r"(?<![A-Za-z])(" + "|".join(HALL_SHEETS) + r")(?![A-Za-z])", re.IGNORECASE)
+
+# Upper bound on the in-memory size of cached frames (bytes).
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+
+
+def content_hash(data: bytes) -> str:
+    """Return a stable fingerprint for the raw bytes of an uploaded file."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def file_hash(file) -> str:
+    """content_hash of a path or buffer, reading files from disk in blocks rather than whole."""
+    if isinstance(file, (bytes, bytearray)) or hasattr(file, "getvalue"):
+        return content_hash(_read_bytes(file))
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file, "rb") as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hall_from_name(name: str):
+    """The hall code in a file name (``EVK_2025-03-31.csv``, ``week2 evk.csv``), or None."""
+    match = _HALL_PATTERN.search(name)
+    return None if match is None else match.group(1).upper()
+
+
+def _read_bytes(file) -> bytes:
+    if isinstance(file, (bytes, bytearray)):
+        return bytes(file)
+    if hasattr(file, "getvalue"):
+        return file.getvalue()
+    with open(file, "rb") as fh:
+        return fh.read()
+
+
+class FrameCache:
+    """LRU cache of parsed DataFrames, bounded by their total memory usage."""
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, frames: dict):
+        size = sum(int(df.memory_usage(deep=True).sum()) for df in frames.values())
+        with self._lock:
+            if key in self._entries:
+                self._total -= self._sizes.pop(key)
+                del self._entries[key]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = frames
+            self._sizes[key] = size
+            self._total += size
+            while self._total > self.max_bytes:
+                old_key, _ = self._entries.popitem(last=False)
+                self._total -= self._sizes.pop(old_key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._total = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Module-level so it survives Streamlit reruns (the module is imported once per server process).
+_cache = FrameCache()
+_disk_cache = ColumnarCache()
+
+
+def _project(frames: dict, columns) -> dict:
+    if columns is None:
+        return frames
+    return {name: df[[column for column in columns if column in df.columns]] for name, df in frames.items()}
+
+
+def _load_or_convert(digest: str, names, columns, disk_cache, parse) -> dict:
+    # Convert the whole schema once so any report's projection can be served from the disk cache
+    disk_cache = _disk_cache if disk_cache is None else disk_cache
+    if disk_cache is False or not columnar_cache_available():
+        return parse(columns)
+    frames = disk_cache.get(digest, names, columns)
+    if frames is None:
+        frames = parse(None)
+        disk_cache.put(digest, frames)
+        frames = _project(frames, columns)
+    return frames
+
+
+def read_hall_sheets(file, sheets=None, cache: FrameCache = None, columns=None, disk_cache=None) -> dict:
+    """
+    Parse the requested sheets of an over production workbook in a single pass.
+
+    Only the schema columns (or just ``columns``) are loaded, already typed; see
+    schema.py. Results are cached by the hash of the file contents, in memory
+    and, when pyarrow is installed, as columnar files on disk (``disk_cache``,
+    False to skip it), so reruns, repeat uploads and later sessions on the same
+    workbook skip parsing. Callers receive copies and are free to modify them.
+    """
+    sheets = list(sheets or HALL_SHEETS)
+    cache = _cache if cache is None else cache
+    data = _read_bytes(file)
+    digest = content_hash(data)
+    key = (digest, tuple(sheets), None if columns is None else tuple(columns))
+
+    frames = cache.get(key)
+    if frames is None:
+        # sheet_name as a list opens the workbook once and parses each sheet from it
+        frames = _load_or_convert(digest, sheets, columns, disk_cache, lambda wanted: read_export_excel(
+            BytesIO(data), sheet_name=sheets, columns=wanted))
+        cache.put(key, frames)
+
+    return {name: df.copy() for name, df in frames.items()}
+
+
+def read_csv_export(file, columns=None, disk_cache=None):
+    """
+    A typed CSV export (path, bytes or buffer), loaded from the disk cache when
+    these exact bytes were read before; see read_hall_sheets.
+
+    Cached frames are memory-mapped and may be read-only, which the report and
+    flagging functions never need to write to; copy before modifying in place.
+    """
+    source = BytesIO(_read_bytes(file)) if isinstance(file, (bytes, bytearray)) or hasattr(file, "getvalue") else file
+    frames = _load_or_convert(file_hash(file), [None], columns, disk_cache, lambda wanted: {
+        None: read_export_csv(source, wanted)})
+    return frames[None]
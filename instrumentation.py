@@ -0,0 +1,138 @@
+"""
+Lightweight per-stage timing and memory instrumentation.
+
+Wrap a pipeline stage in ``stage()`` to record its wall time, the rows it
+processed and its memory use:
+
+    with stage("weekly.aggregate", rows=len(df)):
+        summary = summarize_daily(df)
+
+Each record is logged as one JSON line on the ``overproduction.stages``
+logger. Inside ``recording()`` records are also collected so a Streamlit run
+can show them with ``render_sidebar()``.
+
+Set ``OVERPRODUCTION_INSTRUMENTATION=0`` to turn everything off. Memory is
+reported as the growth of the process peak RSS during the stage. Set
+``OVERPRODUCTION_TRACE_MEMORY=1`` to also trace the exact peak allocation with
+tracemalloc; that is more precise but slows allocation-heavy stages and is
+only meaningful when stages do not run concurrently.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger("overproduction.stages")
+
+_local = threading.local()
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.environ.get(name, default).strip().lower() not in ("0", "false", "no", "off", "")
+
+
+_enabled = _env_flag("OVERPRODUCTION_INSTRUMENTATION", "1")
+_trace_memory = _env_flag("OVERPRODUCTION_TRACE_MEMORY", "0")
+
+
+def set_enabled(enabled: bool):
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    recorder = getattr(_local, "recorder", None)
+    if recorder is not None:
+        return recorder["enabled"]
+    return _enabled
+
+
+def _max_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return max_rss / 2 ** 20 if sys.platform == "darwin" else max_rss / 2 ** 10
+
+
+@contextmanager
+def recording(enabled: bool = None):
+    """Collect the records of every stage run by this thread inside the block."""
+    previous = getattr(_local, "recorder", None)
+    recorder = {"enabled": _enabled if enabled is None else enabled, "records": []}
+    _local.recorder = recorder
+    try:
+        yield recorder["records"]
+    finally:
+        _local.recorder = previous
+
+
+@contextmanager
+def stage(name: str, rows: int = None, **labels):
+    """
+    Time the enclosed block as one stage; ``labels`` (e.g. ``hall="EVK"``) are
+    added to the record. The yielded dict is the record being built; set
+    ``record["rows"]`` inside the block if the count is only known there.
+    """
+    record = {"stage": name, "rows": rows, **labels}
+    if not is_enabled():
+        yield record
+        return
+
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    tracing = _trace_memory
+    if tracing and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    frame = {"child_peak": 0}
+    if tracing:
+        frame["start_current"] = tracemalloc.get_traced_memory()[0]
+        if stack:
+            # Keep what the enclosing stage has peaked at so far before resetting
+            stack[-1]["child_peak"] = max(stack[-1]["child_peak"], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    stack.append(frame)
+    rss_before = _max_rss_mb()
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = round(time.perf_counter() - started, 6)
+        rss_after = _max_rss_mb()
+        if rss_after is not None:
+            record["max_rss_mb"] = round(rss_after, 1)
+            record["rss_growth_mb"] = round(rss_after - rss_before, 1)
+        stack.pop()
+        if tracing:
+            peak = max(frame["child_peak"], tracemalloc.get_traced_memory()[1])
+            record["peak_mb"] = round((peak - frame["start_current"]) / 2 ** 20, 2)
+            if stack:
+                stack[-1]["child_peak"] = max(stack[-1]["child_peak"], peak)
+        _emit(record)
+
+
+def _emit(record: dict):
+    logger.info(json.dumps(record, default=str))
+    recorder = getattr(_local, "recorder", None)
+    if recorder is not None:
+        recorder["records"].append(record)
+
+
+def render_sidebar(records):
+    """Show the stage records of the current run in the Streamlit sidebar."""
+    import pandas as pd
+    import streamlit as st
+
+    if not records:
+        return
+    table = pd.DataFrame(records).set_index("stage")
+    st.sidebar.subheader("⏱️ Stage timings")
+    st.sidebar.dataframe(table)
+    st.sidebar.caption(f"Total {table['seconds'].sum():.2f}s across {len(table)} stages")
@@ -0,0 +1,117 @@
+"""
+Load test for a running report_service.py instance.
+
+Synthetic exports are generated up front, then ``--requests`` reports are
+requested with ``--concurrency`` clients at a time. With ``--distinct`` every
+request carries different data, so each one is rendered by a worker; without
+it most are served from the report cache.
+
+    python report_service.py --port 8765 -j 4 &
+    python load_test.py --url http://127.0.0.1:8765 --kind weekly --requests 200 --concurrency 16 --distinct
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+import pandas as pd
+
+from ingest import HALL_SHEETS
+from synthetic_data import generate_export
+
+
+def monthly_payload(rows: int, seed: int):
+    xlsx = BytesIO()
+    with pd.ExcelWriter(xlsx) as writer:
+        for i, hall in enumerate(HALL_SHEETS):
+            generate_export(rows, seed=seed * len(HALL_SHEETS) + i).to_excel(writer, sheet_name=hall, index=False)
+    return xlsx.getvalue(), "application/octet-stream"
+
+
+def weekly_payload(rows: int, seed: int):
+    boundary = uuid.uuid4().hex
+    body = BytesIO()
+    for i, hall in enumerate(HALL_SHEETS):
+        csv = generate_export(rows, seed=seed * len(HALL_SHEETS) + i).to_csv(index=False).encode()
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{hall}"; filename="{hall}.csv"\r\n'
+                   f'Content-Type: text/csv\r\n\r\n'.encode())
+        body.write(csv)
+        body.write(b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode())
+    return body.getvalue(), f"multipart/form-data; boundary={boundary}"
+
+
+def send(url: str, payload, timeout: float):
+    body, content_type = payload
+    request = Request(url, data=body, headers={"Content-Type": content_type}, method="POST")
+    started = time.perf_counter()
+    try:
+        with urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except HTTPError as exc:
+        status = exc.code
+    except URLError as exc:
+        status = type(exc.reason).__name__
+    except OSError as exc:  # e.g. the connection was reset mid-response
+        status = type(exc).__name__
+    return status, time.perf_counter() - started
+
+
+def _percentile(values, q: float):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run(url: str, kind: str, requests: int, concurrency: int, rows: int, distinct: bool, timeout: float,
+        log=print):
+    build = monthly_payload if kind == "monthly" else weekly_payload
+    payloads = [build(rows, seed) for seed in range(requests if distinct else 1)]
+    endpoint = f"{url.rstrip('/')}/reports/{kind}"
+    log(f"{requests} {kind} requests, {concurrency} at a time, {len(payloads)} distinct payload(s) "
+        f"of {rows:,} rows per hall")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        results = list(clients.map(lambda i: send(endpoint, payloads[i % len(payloads)], timeout), range(requests)))
+    elapsed = time.perf_counter() - started
+
+    statuses = Counter(status for status, _ in results)
+    latencies = [seconds for status, seconds in results if status == 200]
+    summary = {"requests": requests, "seconds": round(elapsed, 3), "statuses": dict(statuses),
+               "throughput_per_s": round(len(latencies) / elapsed, 2)}
+    if latencies:
+        summary.update({
+            "latency_mean_s": round(statistics.mean(latencies), 3),
+            "latency_p50_s": round(_percentile(latencies, 0.5), 3),
+            "latency_p95_s": round(_percentile(latencies, 0.95), 3),
+            "latency_max_s": round(max(latencies), 3),
+        })
+    log(json.dumps(summary, indent=2))
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test a running report service.")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--kind", choices=["monthly", "weekly"], default="weekly")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=20_000, help="rows per hall in each generated export")
+    parser.add_argument("--distinct", action="store_true", help="send different data with every request")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    args = parser.parse_args(argv)
+
+    summary = run(args.url, args.kind, args.requests, args.concurrency, args.rows, args.distinct, args.timeout)
+    return 0 if summary["statuses"].get(200) == args.requests else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
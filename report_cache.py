@@ -0,0 +1,101 @@
+"""
+In-process cache of rendered report workbooks.
+
+Reports are keyed by the report type, a fingerprint of the input data and the
+parameters they were rendered with, so the same upload asked for again, by
+any session, is served from memory without re-aggregating or re-rendering.
+"""
+import threading
+from collections import OrderedDict
+
+from ingest import content_hash
+
+# Upper bound on the total size of cached report bytes.
+DEFAULT_REPORT_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def report_key(kind: str, fingerprint: str, **params):
+    """Cache key of a ``kind`` report ("monthly", "weekly", ...) of the data fingerprinted by ``fingerprint``."""
+    return kind, fingerprint, tuple(sorted(params.items()))
+
+
+def inputs_fingerprint(inputs: dict) -> str:
+    """Fingerprint of several named raw inputs (e.g. hall -> CSV bytes), sensitive to names and order."""
+    return content_hash("\x1f".join(f"{name}={content_hash(data)}" for name, data in inputs.items()).encode())
+
+
+class ReportCache:
+    """LRU cache of rendered report bytes, bounded by their total size."""
+
+    def __init__(self, max_bytes: int = DEFAULT_REPORT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        self._rendering = {}
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, data: bytes):
+        with self._lock:
+            if key in self._entries:
+                self._total -= len(self._entries.pop(key))
+            if len(data) > self.max_bytes:
+                return
+            self._entries[key] = data
+            self._total += len(data)
+            while self._total > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self._total -= len(old)
+
+    def get_or_render(self, key, render) -> bytes:
+        """
+        The cached bytes for ``key``, else ``render()`` (returning bytes or a
+        buffer) cached. Concurrent requests for the same key render it once.
+        """
+        data = self.get(key)
+        if data is not None:
+            return data
+        with self._lock:
+            key_lock = self._rendering.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                data = self.get(key)
+                if data is None:
+                    data = render()
+                    data = data.getvalue() if hasattr(data, "getvalue") else bytes(data)
+                    self.put(key, data)
+        finally:
+            # Also when render() raises, or every failed request would leave its lock behind
+            with self._lock:
+                self._rendering.pop(key, None)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Module-level so every session of the Streamlit server shares it.
+_reports = ReportCache()
+
+
+def get_or_render(key, render) -> bytes:
+    return _reports.get_or_render(key, render)
+
+
+def cached_report(key):
+    return _reports.get(key)
+
+
+def store_report(key, data: bytes):
+    _reports.put(key, data)
@@ -0,0 +1,157 @@
+"""
+Background weekly report jobs.
+
+A job parses and aggregates each hall's CSV concurrently in a pool of worker
+processes, then assembles the workbook on a separate thread once every hall
+is done. Jobs live in this module's registry, which belongs to the Streamlit
+server process rather than to a browser session, so a page can start a job,
+be refreshed or closed, and pick the job up again by its id.
+"""
+import multiprocessing
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+
+import pandas as pd
+import xlsxwriter
+
+from generate_weekly_report import finish_summary, summarize_daily, write_report
+from instrumentation import recording, stage
+from report_cache import cached_report, inputs_fingerprint, report_key, store_report
+from ingest import read_csv_export
+from schema import WEEKLY_COLUMNS
+
+# Finished jobs kept around for late downloads
+MAX_JOBS = 50
+
+_pool = None
+# Done callbacks of _pool run on its result-handling thread; workbooks are assembled here instead
+_assembler = ThreadPoolExecutor(max_workers=2, thread_name_prefix="report-assembly")
+_jobs = {}
+_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            # spawn: forking the multi-threaded Streamlit server is not safe
+            _pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def summarize_hall(hall: str, export):
+    """Parse (unless ``export`` is already a frame) and aggregate one hall's export. Runs in a worker process."""
+    with recording() as records:
+        if isinstance(export, pd.DataFrame):
+            data = export  # parsed, and timed, by upload_ingest
+        else:
+            with stage("weekly.ingest", hall=hall) as record:
+                data = read_csv_export(export, WEEKLY_COLUMNS)
+                record["rows"] = len(data)
+        with stage("weekly.aggregate", rows=len(data), hall=hall):
+            summary = summarize_daily(data)
+    return summary, records
+
+
+def start_weekly_job(hall_files: dict, fingerprint: str = None, records=None) -> str:
+    """
+    Submit one aggregation task per hall (in sheet order) and return the job id.
+
+    The values of ``hall_files`` are CSV bytes, or frames parsed already (see
+    upload_ingest.py), in which case ``fingerprint`` identifies the uploads
+    they came from, and ``records`` holds the stage records of their parses.
+    A job for exactly the same files as an earlier one is finished at once
+    with the workbook from the report cache.
+    """
+    job_id = uuid.uuid4().hex[:12]
+    key = report_key("weekly", fingerprint or inputs_fingerprint(hall_files))
+    job = {
+        "id": job_id,
+        "key": key,
+        "created": time.time(),
+        "halls": list(hall_files),
+        "futures": {},
+        "status": "running",
+        "result": None,
+        "error": None,
+        "records": list(records or []),
+        "finished": None,
+    }
+    result = cached_report(key)
+    if result is not None:
+        job.update(status="done", result=result, finished=job["created"])
+    with _lock:
+        _jobs[job_id] = job
+        _evict()
+    if result is not None:
+        return job_id
+
+    pool = _get_pool()
+    for hall, export in hall_files.items():
+        future = pool.submit(summarize_hall, hall, export)
+        job["futures"][hall] = future
+    for future in job["futures"].values():
+        future.add_done_callback(lambda _, job=job: _assembler.submit(_maybe_assemble, job))
+    return job_id
+
+
+def _maybe_assemble(job: dict):
+    with _lock:
+        if job["status"] != "running" or not all(f.done() for f in job["futures"].values()):
+            return
+        job["status"] = "assembling"
+
+    try:
+        output = BytesIO()
+        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+        for hall in job["halls"]:
+            summary, records = job["futures"][hall].result()
+            job["records"].extend(records)
+            with recording() as records, stage("weekly.render", rows=len(summary), hall=hall):
+                daily, revenue_table = finish_summary(summary)
+                write_report(daily, revenue_table, workbook, workbook.add_worksheet(hall))
+            job["records"].extend(records)
+        with recording() as records, stage("weekly.save"):
+            workbook.close()
+        job["records"].extend(records)
+        job["result"] = output.getvalue()
+        store_report(job["key"], job["result"])
+        job["status"] = "done"
+    except Exception:
+        job["error"] = traceback.format_exc()
+        job["status"] = "failed"
+    job["finished"] = time.time()
+
+
+def _evict():
+    finished = sorted((job for job in _jobs.values() if job["finished"]), key=lambda job: job["finished"])
+    for job in finished[:max(0, len(_jobs) - MAX_JOBS)]:
+        del _jobs[job["id"]]
+
+
+def _hall_status(future) -> str:
+    if future is None:  # served from the report cache
+        return "done"
+    if future.done():
+        return "failed" if future.exception() is not None else "done"
+    return "running" if future.running() else "queued"
+
+
+def get_job(job_id: str):
+    """A snapshot of the job's progress, or None if the id is unknown or was evicted."""
+    job = _jobs.get(job_id)
+    if job is None:
+        return None
+    return {
+        "id": job["id"],
+        "status": job["status"],
+        "halls": {hall: _hall_status(job["futures"].get(hall)) for hall in job["halls"]},
+        "result": job["result"],
+        "error": job["error"],
+        "records": list(job["records"]),
+        "elapsed": (job["finished"] or time.time()) - job["created"],
+    }
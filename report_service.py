@@ -0,0 +1,284 @@
+"""
+Local HTTP service that builds the monthly and weekly workbooks.
+
+Reports are rendered in a pool of worker processes that are started, and have
+pandas, xlsxwriter and the report modules imported, before the first request
+arrives. At most ``--workers`` reports render at once; up to ``--max-pending``
+more wait in line, and requests beyond that are turned away with 503 so a
+burst cannot pile up unbounded work. Identical requests are answered from the
+report cache (see report_cache.py) without touching the pool.
+
+    python report_service.py --port 8765 -j 4
+
+    POST /reports/monthly   body: the monthly .xlsx export
+    POST /reports/weekly    multipart/form-data with one CSV per hall (fields EVK, IRC, UV)
+    GET  /health            pool size and queue state as JSON
+
+    curl --data-binary @March.xlsx -o summary.xlsx localhost:8765/reports/monthly
+    curl -F EVK=@EVK.csv -F IRC=@IRC.csv -F UV=@UV.csv -o weekly.xlsx localhost:8765/reports/weekly
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from email.parser import BytesParser
+from email.policy import HTTP
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ingest import HALL_SHEETS, content_hash
+from report_cache import cached_report, get_or_render, inputs_fingerprint, report_key
+
+logger = logging.getLogger("overproduction.service")
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Uploads larger than this are rejected before they are read
+MAX_UPLOAD_BYTES = 512 * 1024 * 1024
+
+
+class BadRequest(Exception):
+    """The upload could not be turned into a report; reported to the client as 422."""
+
+
+def _warm_up():
+    # Pay the import cost once per worker instead of on its first request
+    import pandas  # noqa: F401
+    import xlsxwriter  # noqa: F401
+
+    import generate_report  # noqa: F401
+    import generate_weekly_report  # noqa: F401
+    import ingest  # noqa: F401
+
+
+def _ready():
+    # Long enough that each warm-up task lands on a worker of its own
+    time.sleep(0.2)
+    return os.getpid()
+
+
+def render_monthly(data: bytes) -> bytes:
+    from generate_report import generate_report
+    from ingest import read_hall_sheets
+    from schema import MONTHLY_COLUMNS
+
+    try:
+        sheets = read_hall_sheets(data, columns=MONTHLY_COLUMNS)
+        return generate_report(sheets).getvalue()
+    except (ValueError, KeyError) as exc:
+        raise BadRequest(f"Could not build the monthly report: {exc!r}") from None
+
+
+def render_weekly(hall_files: dict) -> bytes:
+    from generate_weekly_report import build_weekly_workbook
+    from ingest import read_csv_export
+    from schema import WEEKLY_COLUMNS
+
+    try:
+        frames = {hall: read_csv_export(data, WEEKLY_COLUMNS) for hall, data in hall_files.items()}
+        return build_weekly_workbook(frames).getvalue()
+    except (ValueError, KeyError) as exc:
+        raise BadRequest(f"Could not build the weekly report: {exc!r}") from None
+
+
+class ReportService:
+    """The warm pool plus the admission limit shared by all request threads."""
+
+    def __init__(self, workers: int = None, max_pending: int = 32, timeout: float = 300.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_up)
+        # Rendering plus waiting requests; anything beyond is rejected rather than queued
+        self._slots = threading.BoundedSemaphore(self.workers + max_pending)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.served = 0
+        self.rejected = 0
+
+    def warm(self):
+        """Start every worker now and wait until each has run its initializer."""
+        futures = [self.pool.submit(_ready) for _ in range(self.workers)]
+        return sorted({future.result() for future in futures})
+
+    def render(self, key, fn, *args) -> bytes:
+        """
+        Bytes of the report ``key``, from the cache or rendered by ``fn(*args)``
+        in the pool. Raises OverflowError when the queue is full.
+
+        A request's slot is held until its pool task has finished, not just
+        until the request gives up waiting, so timed-out work still counts
+        against the limit while it runs; if it has not started it is cancelled.
+        """
+        data = cached_report(key)
+        if data is not None:
+            self._count("served")
+            return data
+        if not self._slots.acquire(blocking=False):
+            self._count("rejected")
+            raise OverflowError("Too many reports queued")
+        self._count("in_flight")
+        future = None
+
+        def submit():
+            nonlocal future
+            future = self.pool.submit(fn, *args)
+            future.add_done_callback(self._release)
+            return future.result(timeout=self.timeout)
+
+        try:
+            data = get_or_render(key, submit)
+        except TimeoutError:
+            future.cancel()
+            raise
+        finally:
+            if future is None:  # rendered by a concurrent request for the same key, or never submitted
+                self._release()
+        self._count("served")
+        return data
+
+    def _release(self, future=None):
+        self._count("in_flight", -1)
+        self._slots.release()
+
+    def _count(self, name: str, delta: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + delta)
+
+    def health(self) -> dict:
+        with self._lock:
+            return {"workers": self.workers, "max_pending": self.max_pending, "in_flight": self.in_flight,
+                    "served": self.served, "rejected": self.rejected}
+
+    def shutdown(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+class ReportHandler(BaseHTTPRequestHandler):
+    server_version = "OverProductionReports/1.0"
+    service: ReportService = None
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/health":
+            self._send_json(HTTPStatus.OK, self.service.health())
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        started = time.perf_counter()
+        route = self.path.split("?", 1)[0].rstrip("/")
+        try:
+            if route == "/reports/monthly":
+                data = self._read_body()
+                key = report_key("monthly", content_hash(data), constant_memory=False)
+                workbook = self.service.render(key, render_monthly, data)
+                filename = "Over_Production_Summary.xlsx"
+            elif route == "/reports/weekly":
+                hall_files = self._read_hall_files()
+                key = report_key("weekly", inputs_fingerprint(hall_files))
+                workbook = self.service.render(key, render_weekly, hall_files)
+                filename = "Weekly_Summary.xlsx"
+            else:
+                self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {self.path}"})
+                return
+        except BadRequest as exc:
+            self._send_json(HTTPStatus.UNPROCESSABLE_ENTITY, {"error": str(exc)})
+            return
+        except OverflowError as exc:
+            self._send_json(HTTPStatus.SERVICE_UNAVAILABLE, {"error": str(exc)}, {"Retry-After": "5"})
+            return
+        except TimeoutError:
+            self._send_json(HTTPStatus.GATEWAY_TIMEOUT, {"error": "The report took too long to build"})
+            return
+        except Exception as exc:
+            logger.exception("Report request failed")
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": repr(exc)})
+            return
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", XLSX_MIME)
+        self.send_header("Content-Length", str(len(workbook)))
+        self.send_header("Content-Disposition", f'attachment; filename="{filename}"')
+        self.send_header("X-Elapsed-Seconds", f"{time.perf_counter() - started:.3f}")
+        self.end_headers()
+        self.wfile.write(workbook)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            raise BadRequest("Empty upload")
+        if length > MAX_UPLOAD_BYTES:
+            raise BadRequest(f"Upload of {length} bytes is over the {MAX_UPLOAD_BYTES} byte limit")
+        return self.rfile.read(length)
+
+    def _read_hall_files(self) -> dict:
+        content_type = self.headers.get("Content-Type", "")
+        if not content_type.startswith("multipart/form-data"):
+            raise BadRequest("Send the hall CSVs as multipart/form-data fields named EVK, IRC and UV")
+        body = self._read_body()
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+        files = {part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+                 for part in message.iter_parts()}
+        missing = [hall for hall in HALL_SHEETS if hall not in files]
+        if missing:
+            raise BadRequest(f"Missing hall files: {', '.join(missing)}")
+        # Keep the sheet order of the weekly app
+        return {hall: files[hall] for hall in HALL_SHEETS}
+
+    def _send_json(self, status: HTTPStatus, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+
+class ReportServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Bursts of connections wait in the listen backlog; ReportService decides what gets rejected
+    request_queue_size = 128
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765, workers: int = None, max_pending: int = 32,
+          timeout: float = 300.0):
+    service = ReportService(workers, max_pending, timeout)
+    pids = service.warm()
+    handler = type("BoundReportHandler", (ReportHandler,), {"service": service})
+    server = ReportServer((host, port), handler)
+    logger.info("Serving reports on http://%s:%d with %d warm workers %s", host, server.server_port,
+                len(pids), pids)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve over production reports over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--max-pending", type=int, default=32,
+                        help="requests allowed to wait for a worker before new ones get 503")
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds a single report may take")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    serve(args.host, args.port, args.workers, args.max_pending, args.timeout)
+
+
+if __name__ == "__main__":
+    main()
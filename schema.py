@@ -0,0 +1,140 @@
+"""
+Declared schema of the over production export and typed readers for it.
+
+Only the columns listed here are loaded; everything else in the raw exports is
+skipped at parse time. Repetitive text is stored as categoricals, money as
+float64, dates as datetime64 (unparseable values become NaT) and portion and
+customer counts are downcast to the smallest integer type that holds them.
+Counts with missing values stay float64 so sums keep skipping them.
+
+validate_export_csv and validate_export_excel check an export against the
+schema from its header and first PREVIEW_ROWS rows only, so a wrong file is
+reported in well under a second instead of failing at the end of a full parse.
+"""
+import zipfile
+
+import pandas as pd
+
+CATEGORY = "category"
+FLOAT = "float"
+DATETIME = "datetime"
+COUNT = "count"
+
+EXPORT_SCHEMA = {
+    "hall": CATEGORY,
+    "srvcrsname": CATEGORY,
+    "itemname": CATEGORY,
+    "costprice": FLOAT,
+    "Total_Cost": FLOAT,
+    "eventdate": DATETIME,
+    "fcst_prtncount": COUNT,
+    "served_prtncount": COUNT,
+    "sold_prtncount": COUNT,
+    "fcst_custcount": COUNT,
+    "sold_custcount": COUNT,
+}
+
+# Columns each report reads; "hall" is optional everywhere
+MONTHLY_COLUMNS = ["srvcrsname", "Total_Cost", "eventdate"]
+WEEKLY_COLUMNS = ["srvcrsname", "itemname", "costprice", "eventdate", "fcst_prtncount", "served_prtncount",
+                  "sold_prtncount", "fcst_custcount", "sold_custcount"]
+
+
+# Rows read to validate an export before parsing all of it
+PREVIEW_ROWS = 1000
+
+
+def _selector(columns):
+    wanted = set(EXPORT_SCHEMA if columns is None else columns)
+    # A callable tolerates columns missing from a file, unlike a list
+    return lambda name: name in wanted
+
+
+def _read_dtypes(columns):
+    # Categoricals can be built by the parser itself; the rest is converted afterwards
+    return {name: "category" for name, kind in EXPORT_SCHEMA.items()
+            if kind == CATEGORY and (columns is None or name in columns)}
+
+
+def _downcast_count(series: pd.Series):
+    series = pd.to_numeric(series, errors="coerce")
+    if series.hasnans:
+        return series.astype("float64", copy=False)
+    return pd.to_numeric(series, downcast="integer")
+
+
+def apply_schema(df: pd.DataFrame):
+    """A new frame with every schema column of ``df`` converted; ``df`` itself is left untouched."""
+    converted = {}
+    for name, series in df.items():
+        kind = EXPORT_SCHEMA.get(name)
+        if kind == CATEGORY and not isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype("category")
+        elif kind == FLOAT:
+            series = pd.to_numeric(series, errors="coerce").astype("float64", copy=False)
+        elif kind == DATETIME and not pd.api.types.is_datetime64_any_dtype(series):
+            series = pd.to_datetime(series, errors="coerce")
+        elif kind == COUNT:
+            series = _downcast_count(series)
+        converted[name] = series
+    return pd.DataFrame(converted, index=df.index, copy=False)
+
+
+def read_export_csv(source, columns=None, chunksize: int = None):
+    """
+    Read a CSV export with only the schema columns (or ``columns``), typed.
+
+    With ``chunksize`` an iterator of typed chunks is returned instead.
+    """
+    reader = pd.read_csv(source, usecols=_selector(columns), dtype=_read_dtypes(columns), chunksize=chunksize)
+    if chunksize:
+        return (apply_schema(chunk) for chunk in reader)
+    return apply_schema(reader)
+
+
+def read_export_excel(source, sheet_name=0, columns=None):
+    """read_excel counterpart of read_export_csv; ``sheet_name`` may be a list, giving a dict of frames."""
+    frames = pd.read_excel(source, sheet_name=sheet_name, usecols=_selector(columns), dtype=_read_dtypes(columns))
+    if isinstance(frames, dict):
+        return {name: apply_schema(df) for name, df in frames.items()}
+    return apply_schema(frames)
+
+
+def _preview_problems(preview: pd.DataFrame, columns):
+    required = [name for name in EXPORT_SCHEMA if name != "hall"] if columns is None else list(columns)
+    missing = [name for name in required if name not in preview.columns]
+    problems = [f"missing column{'s' if len(missing) > 1 else ''} {', '.join(missing)}"] if missing else []
+    if "eventdate" in required and "eventdate" not in missing and len(preview):
+        if pd.to_datetime(preview["eventdate"], errors="coerce").isna().all():
+            problems.append(f"no readable eventdate in the first {len(preview)} rows")
+    return problems
+
+
+def validate_export_csv(source, columns=None, name: str = "The export"):
+    """
+    Check that a CSV export has the schema columns (or ``columns``) from its
+    first PREVIEW_ROWS rows, raising ValueError naming every problem found.
+    """
+    try:
+        preview = pd.read_csv(source, nrows=PREVIEW_ROWS)
+    except ValueError as exc:  # includes empty files, parser and decoding errors
+        raise ValueError(f"{name} could not be read as a CSV file: {exc}") from None
+    problems = _preview_problems(preview, columns)
+    if problems:
+        raise ValueError(f"{name}: {'; '.join(problems)}")
+
+
+def validate_export_excel(source, sheets, columns=None, name: str = "The workbook"):
+    """validate_export_csv for the ``sheets`` of an Excel export; a missing sheet is a problem too."""
+    try:
+        workbook = pd.ExcelFile(source)
+    except (ValueError, zipfile.BadZipFile) as exc:
+        raise ValueError(f"{name} could not be read as an Excel workbook: {exc}") from None
+    with workbook:
+        problems = [f"missing sheet {sheet}" for sheet in sheets if sheet not in workbook.sheet_names]
+        for sheet in sheets:
+            if sheet in workbook.sheet_names:
+                preview = workbook.parse(sheet, nrows=PREVIEW_ROWS)
+                problems.extend(f"sheet {sheet}: {problem}" for problem in _preview_problems(preview, columns))
+    if problems:
+        raise ValueError(f"{name}: {'; '.join(problems)}")
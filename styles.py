@@ -0,0 +1,115 @@
+import math
+import weakref
+
+import xlsxwriter
+
+_registries = weakref.WeakKeyDictionary()
+
+
+class FormatRegistry:
+    """Creates each distinct cell format once per workbook and hands back the shared instance."""
+
+    def __init__(self, workbook: xlsxwriter.Workbook):
+        self.workbook = workbook
+        self._formats = {}
+
+    def get(self, base: dict = None, **overrides):
+        props = dict(base or {})
+        props.update(overrides)
+        key = tuple(sorted(props.items()))
+        fmt = self._formats.get(key)
+        if fmt is None:
+            fmt = self.workbook.add_format(props)
+            self._formats[key] = fmt
+        return fmt
+
+    def __len__(self):
+        return len(self._formats)
+
+
+def format_registry(workbook: xlsxwriter.Workbook) -> FormatRegistry:
+    """Return the registry shared by every renderer writing into ``workbook``."""
+    registry = _registries.get(workbook)
+    if registry is None:
+        registry = FormatRegistry(workbook)
+        _registries[workbook] = registry
+    return registry
+
+
+def workbook_options(constant_memory: bool = False) -> dict:
+    """
+    Options for xlsxwriter.Workbook.
+
+    constant_memory flushes each row to disk once a later row is started, so
+    memory stays flat for large sheets; rows must then be written top to bottom.
+    in_memory would override it, so it is only used in the default mode.
+    """
+    if constant_memory:
+        return {'constant_memory': True}
+    return {'in_memory': True}
+
+
+def _format_runs(formats):
+    # (start, end, format) for each stretch of adjacent columns sharing one format
+    runs, start = [], 0
+    for col in range(1, len(formats) + 1):
+        if col == len(formats) or formats[col] is not formats[start]:
+            runs.append((start, col, formats[start]))
+            start = col
+    return runs
+
+
+def write_rows(worksheet, first_row: int, first_col: int, rows, formats):
+    """
+    Write a block of rows top to bottom, which keeps it valid in constant_memory mode.
+
+    ``formats`` holds one entry per column, a format or None. Adjacent columns
+    sharing one format are written with a single write_row call.
+    """
+    runs = [(first_col + start, start, end, fmt) for start, end, fmt in _format_runs(formats)]
+    row_num = first_row
+    for values in rows:
+        for col, start, end, fmt in runs:
+            worksheet.write_row(row_num, col, values[start:end], fmt)
+        row_num += 1
+    return row_num
+
+
+def _cell_values(table):
+    # xlsxwriter cannot write NaN or inf (e.g. a 0/0 ratio); None leaves the cell blank
+    return [[None if isinstance(value, float) and not math.isfinite(value) else value for value in row]
+            for row in table.values.tolist()]
+
+
+def write_table(worksheet, first_row: int, first_col: int, table, formats: dict, header_format=None,
+                total_formats: dict = None, conditional: dict = None):
+    """
+    Write a DataFrame as a table block and return the row after it.
+
+    ``formats`` maps column names to their cell format; with ``header_format``
+    the column names are written above the rows, and with ``total_formats`` the
+    last row is the totals row and uses those formats instead. ``conditional``
+    maps column names to a list of xlsxwriter conditional_format options, which
+    are applied to the column's whole range so Excel, not Python, picks the
+    format of each value. NaN and infinite values are left blank.
+    """
+    columns = list(table.columns)
+    row_num = first_row
+    if header_format is not None:
+        worksheet.write_row(row_num, first_col, columns, header_format)
+        row_num += 1
+
+    data_start = row_num
+    rows = _cell_values(table)
+    body = rows[:-1] if total_formats is not None else rows
+    row_num = write_rows(worksheet, row_num, first_col, body, [formats.get(column) for column in columns])
+    if total_formats is not None:
+        row_num = write_rows(worksheet, row_num, first_col, rows[-1:],
+                             [total_formats.get(column) for column in columns])
+
+    if row_num > data_start:
+        for column, rules in (conditional or {}).items():
+            col = first_col + columns.index(column)
+            for rule in rules:
+                worksheet.conditional_format(data_start, col, row_num - 1, col, rule)
+    return row_num
@@ -0,0 +1,117 @@
+"""
+Synthetic over production exports for benchmarks and local testing.
+
+The frames follow the shape of the real exports: each day has a few meal
+periods (``srvcrsname``) whose forecast and sold customer counts repeat on every
+item row, a share of ``RES _REVENUE_`` rows, and ``**Donated``, ``**Reused`` and
+``**Thrown`` over production rows that carry a ``Total_Cost``.
+
+    python synthetic_data.py 1000000 EVK_week1.csv
+    python synthetic_data.py 10000000 big.csv --days 120 --hall EVK
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+MEAL_PERIODS = ["Breakfast", "Lunch", "Dinner", "Late Night"]
+OVER_PRODUCTION_CATEGORIES = ["**Reused", "**Thrown", "**Donated"]
+MENU_ITEMS = [
+    "Scrambled Eggs", "Turkey Sausage", "Pancakes", "Oatmeal", "Fruit Cup", "Caesar Salad",
+    "Grilled Chicken", "Steamed Rice", "Pasta Marinara", "Black Bean Burger", "Roasted Vegetables",
+    "Tomato Soup", "Beef Tacos", "Tofu Stir Fry", "Chocolate Chip Cookie", "Pizza Slice",
+]
+REVENUE_ITEMS = ["RES _REVENUE_ MEAL SWIPE", "RES _REVENUE_ DINING DOLLARS", "RES _REVENUE_ CASH"]
+
+COLUMNS = ["srvcrsname", "itemname", "costprice", "Total_Cost", "eventdate", "fcst_prtncount",
+           "served_prtncount", "sold_prtncount", "fcst_custcount", "sold_custcount"]
+
+
+def _period_counts(rng, days: int):
+    # Customer counts are fixed per (day, meal period) and repeated on every row of it
+    n_periods = days * len(MEAL_PERIODS)
+    period_fcst = rng.integers(200, 1500, n_periods)
+    period_sold = (period_fcst * rng.uniform(0.8, 1.05, n_periods)).astype(np.int64)
+    return period_fcst, period_sold
+
+
+def _export_rows(rng, n_rows: int, period_fcst, period_sold, start: str, hall: str = None,
+                 over_production_share: float = 0.1, revenue_share: float = 0.05):
+    period = rng.integers(0, len(period_fcst), n_rows)
+    day = period // len(MEAL_PERIODS)
+    dates = pd.Timestamp(start) + pd.to_timedelta(day, unit="D")
+
+    kind = rng.random(n_rows)
+    is_over_production = kind < over_production_share
+    is_revenue = (kind >= over_production_share) & (kind < over_production_share + revenue_share)
+
+    srvcrsname = np.asarray(MEAL_PERIODS, dtype=object)[period % len(MEAL_PERIODS)]
+    srvcrsname[is_over_production] = rng.choice(OVER_PRODUCTION_CATEGORIES, is_over_production.sum())
+    itemname = rng.choice(np.asarray(MENU_ITEMS, dtype=object), n_rows)
+    itemname[is_revenue] = rng.choice(REVENUE_ITEMS, is_revenue.sum())
+
+    costprice = np.round(rng.lognormal(0.2, 0.7, n_rows), 4)
+    fcst = rng.integers(0, 120, n_rows)
+    served = np.maximum(fcst + rng.integers(-30, 15, n_rows), 0)
+    sold = np.maximum(served - rng.integers(0, 20, n_rows), 0)
+    total_cost = np.where(is_over_production, np.round(costprice * rng.integers(1, 40, n_rows), 2), 0.0)
+
+    df = pd.DataFrame({
+        "srvcrsname": srvcrsname,
+        "itemname": itemname,
+        "costprice": costprice,
+        "Total_Cost": total_cost,
+        "eventdate": dates.strftime("%m/%d/%Y"),
+        "fcst_prtncount": fcst,
+        "served_prtncount": served,
+        "sold_prtncount": sold,
+        "fcst_custcount": period_fcst[period],
+        "sold_custcount": period_sold[period],
+    })
+    if hall is not None:
+        df.insert(0, "hall", hall)
+    return df
+
+
+def generate_export(n_rows: int, start: str = "2025-03-31", days: int = 7, seed: int = 0,
+                    hall: str = None, over_production_share: float = 0.1, revenue_share: float = 0.05):
+    """A schema-faithful export of ``n_rows`` rows spread over ``days`` days starting at ``start``."""
+    rng = np.random.default_rng(seed)
+    period_fcst, period_sold = _period_counts(rng, days)
+    return _export_rows(rng, n_rows, period_fcst, period_sold, start, hall, over_production_share, revenue_share)
+
+
+def write_export_csv(path: str, n_rows: int, chunk_rows: int = 1_000_000, seed: int = 0,
+                     start: str = "2025-03-31", days: int = 7, **kwargs):
+    """
+    Write a generated export to CSV in chunks, so 10M-row files never sit in memory at once.
+
+    The per-(day, meal period) customer counts are drawn once for the whole
+    file; only the row-level columns are generated per chunk. A file written
+    in a single chunk is the same as generate_export with the same arguments.
+    """
+    rng = np.random.default_rng(seed)
+    period_fcst, period_sold = _period_counts(rng, days)
+    written = 0
+    while written < n_rows:
+        rows = min(chunk_rows, n_rows - written)
+        df = _export_rows(rng, rows, period_fcst, period_sold, start, **kwargs)
+        df.to_csv(path, mode="a" if written else "w", header=not written, index=False)
+        written += rows
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic over production export as CSV.")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("path")
+    parser.add_argument("--start", default="2025-03-31")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--hall", default=None, help="add a hall column with this value")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    write_export_csv(args.path, args.rows, seed=args.seed, start=args.start, days=args.days, hall=args.hall)
+
+
+if __name__ == "__main__":
+    main()
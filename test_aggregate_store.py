@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+from aggregate_store import AggregateStore, daily_over_production, frame_fingerprint
+
+
+def _export():
+    return pd.DataFrame({
+        "srvcrsname": ["**Thrown", "**Reused", "**Thrown", "**Donated", "Lunch"],
+        "Total_Cost": [100.0, 25.5, 40.0, 10.0, 999.0],
+        "eventdate": ["04/01/2025", "04/02/2025", "04/02/2025", "04/03/2025", "04/02/2025"],
+    })
+
+
+def test_resave_without_a_day_drops_its_stored_rows(tmp_path):
+    store = AggregateStore(str(tmp_path / "store.sqlite3"))
+    export = _export()
+    store.save("EVK", "over_production", daily_over_production(export), frame_fingerprint(export))
+
+    # A corrected re-export of the same span without the 04/02 over production rows
+    corrected = export[~((export["eventdate"] == "04/02/2025") & export["srvcrsname"].str.startswith("**"))]
+    store.save("EVK", "over_production", daily_over_production(corrected), frame_fingerprint(corrected))
+
+    costs = store.over_production_costs(halls=["EVK"])
+    assert costs.sum() == pytest.approx(110.0)
+    assert set(store.over_production_days(halls=["EVK"])["date"].dt.day) == {1, 3}
+
+
+def test_resave_without_a_day_drops_its_service_row(tmp_path):
+    store = AggregateStore(str(tmp_path / "store.sqlite3"))
+    metrics = {"pre_service_cust_count": 1.0, "post_service_customer_count": 1.0,
+               "pre_service_total_cost": 1.0, "post_service_total_cost": 1.0, "revenue": 1.0}
+    days = pd.DataFrame([{"date": f"2025-04-0{day}", **metrics} for day in (1, 2, 3)])
+    store.save("UV", "service", days, "first")
+    store.save("UV", "service", days.drop(index=1), "corrected")
+
+    summary = store.service_summary("UV")
+    assert [day.day for day in summary["Date"]] == [1, 3]
+
+
+def test_resave_keeps_other_halls_and_days_outside_the_span(tmp_path):
+    store = AggregateStore(str(tmp_path / "store.sqlite3"))
+    export = _export()
+    daily = daily_over_production(export)
+    store.save("IRC", "over_production", daily, frame_fingerprint(export))
+    store.save("EVK", "over_production", daily, frame_fingerprint(export))
+
+    later = daily[daily["date"] == pd.Timestamp("2025-04-02")]
+    store.save("EVK", "over_production", later, "later")
+
+    assert store.over_production_costs(halls=["IRC"]).sum() == pytest.approx(175.5)
+    assert store.over_production_costs(halls=["EVK"]).sum() == pytest.approx(175.5)
@@ -0,0 +1,78 @@
+import openpyxl
+import pandas as pd
+
+import batch_report
+from generate_report import generate_report
+from synthetic_data import generate_export
+
+HALLS = ["EVK", "IRC", "UV"]
+
+
+def _workbook_values(source):
+    workbook = openpyxl.load_workbook(source)
+    return {sheet.title: [list(row) for row in sheet.iter_rows(values_only=True)] for sheet in workbook}
+
+
+def test_reports_rolled_up_from_the_store_match_the_exports(tmp_path):
+    exports = tmp_path / "exports"
+    exports.mkdir()
+    frames = {hall: generate_export(6000, start="2025-04-01", days=30, seed=seed) for seed, hall in enumerate(HALLS)}
+    with pd.ExcelWriter(exports / "April.xlsx") as writer:
+        for hall, df in frames.items():
+            df.to_excel(writer, sheet_name=hall, index=False)
+    for hall, df in frames.items():
+        df.to_csv(exports / f"{hall}_April.csv", index=False)
+    store = str(tmp_path / "store.sqlite3")
+
+    assert batch_report.main([str(exports), "-o", str(tmp_path / "raw"), "--store", store, "-j", "1"]) == 0
+    assert batch_report.main(["--from-store", "--store", store, "-o", str(tmp_path / "stored"), "-j", "1"]) == 0
+
+    assert (_workbook_values(tmp_path / "stored" / "stored_Over_Production_Summary.xlsx")
+            == _workbook_values(tmp_path / "raw" / "April_Over_Production_Summary.xlsx"))
+    assert (_workbook_values(tmp_path / "stored" / "stored_Weekly_Summary.xlsx")
+            == _workbook_values(tmp_path / "raw" / "April_Weekly_Summary.xlsx"))
+
+
+def test_from_store_window_names_the_outputs_by_period(tmp_path):
+    jobs = batch_report.store_jobs("store.sqlite3", "reports", ("2025-04-01", "2025-04-30"))
+    assert [(job["kind"], job["output"]) for job in jobs] == [
+        ("monthly", "reports/2025-04-01_to_2025-04-30_Over_Production_Summary.xlsx"),
+        ("weekly", "reports/2025-04-01_to_2025-04-30_Weekly_Summary.xlsx"),
+    ]
+
+
+def _long_exports(tmp_path, days):
+    exports = tmp_path / "exports"
+    exports.mkdir()
+    frames = {}
+    for seed, (hall, hall_days) in enumerate(days.items()):
+        frames[hall] = generate_export(300 * hall_days, start="2025-03-31", days=hall_days, seed=seed)
+        frames[hall].to_csv(exports / f"{hall}_spring.csv", index=False)
+    return exports, frames
+
+
+def test_iso_weeks_of_long_exports_covering_different_spans(tmp_path):
+    exports, frames = _long_exports(tmp_path, {"EVK": 21, "IRC": 21, "UV": 14})
+    reports = tmp_path / "reports"
+    assert batch_report.main([str(exports), "-o", str(reports), "--iso-weeks", "--monthly-summary", "-j", "1"]) == 0
+
+    weeks = sorted(path.name for path in reports.glob("*_Weekly_Summary.xlsx"))
+    assert weeks == [f"spring_2025-{day}_Weekly_Summary.xlsx" for day in ("03-31", "04-07", "04-14")]
+    last_week = openpyxl.load_workbook(reports / weeks[-1])
+    assert [cell.value for cell in last_week["UV"][4]] == ["Totals:", None, 0, 0, 0, 0, None]
+
+    assert (_workbook_values(reports / "spring_Over_Production_Summary.xlsx")
+            == _workbook_values(generate_report(frames)))
+
+
+def test_monthly_summary_of_a_window_only_counts_its_days(tmp_path):
+    exports, frames = _long_exports(tmp_path, {"EVK": 21, "IRC": 21, "UV": 14})
+    reports = tmp_path / "reports"
+    assert batch_report.main([str(exports), "-o", str(reports), "--from", "2025-04-07", "--to", "2025-04-20",
+                              "--monthly-summary", "-j", "1"]) == 0
+
+    in_window = {hall: df[pd.to_datetime(df["eventdate"]).between("2025-04-07", "2025-04-20")]
+                 for hall, df in frames.items()}
+    assert (_workbook_values(reports / "spring_Over_Production_Summary.xlsx")
+            == _workbook_values(generate_report(in_window)))
+    assert openpyxl.load_workbook(reports / "spring_Weekly_Summary.xlsx").sheetnames == ["EVK", "IRC", "UV"]
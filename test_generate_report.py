@@ -0,0 +1,27 @@
+import openpyxl
+import pytest
+
+from aggregate_store import AggregateStore
+from generate_report import generate_report, generate_report_from_store
+from synthetic_data import generate_export
+
+
+def _sheet_values(buffer):
+    sheet = openpyxl.load_workbook(buffer)["Over Production Summary"]
+    return [list(row) for row in sheet.iter_rows(values_only=True)]
+
+
+def test_month_rolled_up_from_the_store_matches_the_raw_exports(tmp_path):
+    frames = {hall: generate_export(3000, start="2025-04-01", days=30, seed=seed)
+              for seed, hall in enumerate(["EVK", "IRC", "UV"])}
+    store = AggregateStore(str(tmp_path / "store.sqlite3"))
+    expected = _sheet_values(generate_report(frames, store=store))
+
+    assert _sheet_values(generate_report_from_store(store)) == expected
+    assert _sheet_values(generate_report_from_store(store, "2025-04-01", "2025-04-30")) == expected
+
+
+def test_store_rollup_without_stored_days_raises(tmp_path):
+    store = AggregateStore(str(tmp_path / "store.sqlite3"))
+    with pytest.raises(ValueError, match="No stored over production days"):
+        generate_report_from_store(store, "2025-04-01", "2025-04-30")
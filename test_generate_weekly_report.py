@@ -0,0 +1,172 @@
+import datetime
+from io import BytesIO, StringIO
+
+import openpyxl
+import pandas as pd
+import pytest
+import xlsxwriter
+
+from generate_weekly_report import (build_iso_week_workbooks, build_window_workbook, finish_summary, index_halls,
+                                    summarize_daily, summarize_daily_csv, write_report)
+from schema import read_export_csv
+from synthetic_data import generate_export
+
+EXPORT_CSV = """\
+srvcrsname,itemname,costprice,Total_Cost,eventdate,fcst_prtncount,served_prtncount,sold_prtncount,fcst_custcount,sold_custcount
+Lunch,Rice,2.5,,04/01/2025,10,8,7,100,90
+Lunch,RES _REVENUE_ MEAL SWIPE,0,,04/01/2025,0,0,85,100,90
+Lunch,,1.25,,04/01/2025,4,4,3,100,90
+Dinner,Pasta,3.0,,04/01/2025,20,18,15,150,140
+Dinner,RES _REVENUE_ CASH,0,,04/01/2025,0,0,12,150,140
+**Thrown,Rice,2.5,6.25,04/01/2025,,,,,
+Lunch,Soup,1.5,,04/02/2025,12,10,9,80,
+Lunch,,2.0,,04/02/2025,5,5,5,80,
+Lunch,RES _REVENUE_ MEAL SWIPE,0,,04/02/2025,0,0,60,80,
+Breakfast,Eggs,1.0,,not a date,6,6,6,40,40
+"""
+
+
+def test_streaming_summary_matches_in_memory_with_blank_item_names():
+    expected = summarize_daily(pd.read_csv(StringIO(EXPORT_CSV)))
+    # One row per chunk, so the blank item names land in chunks of their own
+    streamed = summarize_daily_csv(StringIO(EXPORT_CSV), chunksize=1)
+
+    assert list(streamed['Date']) == list(expected['Date'])
+    for column in ['pre_service_cust_count', 'post_service_customer_count', 'revenue']:
+        assert streamed[column].tolist() == expected[column].tolist()
+    for column in ['pre_service_total_cost', 'post_service_total_cost']:
+        assert streamed[column].tolist() == pytest.approx(expected[column].tolist())
+    assert expected['revenue'].tolist() == [97, 60]
+
+
+def test_weekly_sheet_rounds_costs_with_python_round():
+    summary = pd.DataFrame({
+        'Date': [datetime.date(2025, 4, 1), datetime.date(2025, 4, 2)],
+        'pre_service_cust_count': [100, 120],
+        'post_service_customer_count': [90, 110],
+        'pre_service_total_cost': [2.675, 57690.835],
+        'post_service_total_cost': [48644.935, 3.0],
+        'revenue': [50, 60],
+    })
+    daily, revenue_table = finish_summary(summary)
+    output = BytesIO()
+    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+    write_report(daily, revenue_table, workbook, workbook.add_worksheet('EVK'))
+    workbook.close()
+
+    sheet = openpyxl.load_workbook(output)['EVK']
+    assert [sheet['E4'].value, sheet['E5'].value] == [2.67, 57690.83]
+    assert [sheet['F4'].value, sheet['F5'].value] == [48644.93, 3.0]
+
+
+# Two days with missing customer counts on some rows, plus a row whose date does not parse
+EQUIVALENCE_CSV = """\
+srvcrsname,itemname,costprice,Total_Cost,eventdate,fcst_prtncount,served_prtncount,sold_prtncount,fcst_custcount,sold_custcount
+Breakfast,Eggs,1.1,,03/31/2025,30,25,20,200,180
+Breakfast,Toast,0.4,,03/31/2025,40,44,41,200,180
+Breakfast,RES _REVENUE_ MEAL SWIPE,0,,03/31/2025,0,0,170,200,180
+Lunch,Rice,2.5,,03/31/2025,10,8,7,,150
+Lunch,Soup,1.75,,03/31/2025,12,12,11,,150
+Lunch,RES _REVENUE_ CASH,0,,03/31/2025,0,0,9,,150
+**Thrown,Rice,2.5,6.25,03/31/2025,,,,,
+**Donated,Soup,1.75,3.5,03/31/2025,,,,,
+Dinner,Pasta,3.0,,04/01/2025,20,18,15,150,
+Dinner,Salad,2.2,,04/01/2025,,9,8,150,
+Dinner,RES _REVENUE_ MEAL SWIPE,0,,04/01/2025,0,0,130,150,
+Late Night,Pizza,1.9,,04/01/2025,15,17,16,60,55
+**Reused,Pasta,3.0,12.0,04/01/2025,,,,,
+Breakfast,Eggs,1.1,,31/13/2025,30,25,20,200,180
+"""
+
+
+def _reference_summary(data: pd.DataFrame):
+    # The summary and revenue table as add_report computed them before the refactor
+    filtered_data = data[~data['srvcrsname'].isin(['**Donated', '**Reused', '**Thrown'])].copy()
+    filtered_data['eventdate'] = pd.to_datetime(filtered_data['eventdate'], errors='coerce')
+    filtered_data = filtered_data.dropna(subset=['eventdate'])
+    filtered_data['fcst_prtncount'] = pd.to_numeric(filtered_data['fcst_prtncount'], errors='coerce').fillna(0)
+    filtered_data['served_prtncount'] = pd.to_numeric(filtered_data['served_prtncount'], errors='coerce').fillna(0)
+    filtered_data['costprice'] = pd.to_numeric(filtered_data['costprice'], errors='coerce').fillna(0)
+    filtered_data['pre_service_cost'] = filtered_data['fcst_prtncount'] * filtered_data['costprice']
+    filtered_data['post_service_cost'] = filtered_data['served_prtncount'] * filtered_data['costprice']
+
+    unique_fcst_custcount_sum = (
+        filtered_data.drop_duplicates(subset=['eventdate', 'fcst_custcount'])
+        .groupby(filtered_data['eventdate'].dt.date)['fcst_custcount'].sum()
+    )
+    unique_sold_custcount_sum = (
+        filtered_data.drop_duplicates(subset=['eventdate', 'sold_custcount'])
+        .groupby(filtered_data['eventdate'].dt.date)['sold_custcount'].sum()
+    )
+    summary = filtered_data.groupby(filtered_data['eventdate'].dt.date).agg(
+        pre_service_total_cost=('pre_service_cost', 'sum'),
+        post_service_total_cost=('post_service_cost', 'sum')
+    ).reset_index()
+    summary = summary.merge(unique_fcst_custcount_sum, on='eventdate', how='left')
+    summary = summary.merge(unique_sold_custcount_sum, on='eventdate', how='left')
+    revenue_data = filtered_data[filtered_data['itemname'].str.startswith('RES _REVENUE_')]
+    revenue_summary = revenue_data.groupby(revenue_data['eventdate'].dt.date).agg(
+        revenue=('sold_prtncount', 'sum')
+    ).reset_index()
+    summary = pd.merge(summary, revenue_summary, on='eventdate', how='left').fillna(0)
+    summary = summary.rename(columns={
+        'eventdate': 'Date',
+        'fcst_custcount': 'pre_service_cust_count',
+        'sold_custcount': 'post_service_customer_count'
+    })[['Date', 'pre_service_cust_count', 'post_service_customer_count',
+        'pre_service_total_cost', 'post_service_total_cost', 'revenue']]
+
+    summary.loc[len(summary)] = ['Totals:', summary['pre_service_cust_count'].sum(),
+                                 summary['post_service_customer_count'].sum(),
+                                 summary['pre_service_total_cost'].sum(),
+                                 summary['post_service_total_cost'].sum(), summary['revenue'].sum()]
+    summary['total_cost_variance'] = (summary['post_service_total_cost'] - summary['pre_service_total_cost']) / summary[
+        'pre_service_total_cost']
+    summary['Day'] = summary['Date'].map(lambda x: pd.Timestamp(x).day_name() if x != 'Totals:' else 'Totals:')
+
+    revenue_table = summary[['revenue']][:-1].copy()
+    revenue_table.loc[len(revenue_table)] = revenue_table['revenue'].sum()
+    revenue_table['sales_per_person'] = summary['revenue'] / summary['post_service_customer_count']
+    revenue_table['cost_per_person'] = summary['post_service_total_cost'] / summary['post_service_customer_count']
+    revenue_table['margin'] = revenue_table['sales_per_person'] - revenue_table['cost_per_person']
+    revenue_table['margin_percentage'] = revenue_table['cost_per_person'] / revenue_table['sales_per_person']
+    return summary, revenue_table
+
+
+@pytest.mark.parametrize('read', [pd.read_csv, read_export_csv], ids=['raw', 'typed'])
+def test_summary_matches_the_pre_refactor_algorithm(read):
+    expected_summary, expected_revenue = _reference_summary(pd.read_csv(StringIO(EQUIVALENCE_CSV)))
+    summary, revenue_table = finish_summary(summarize_daily(read(StringIO(EQUIVALENCE_CSV))))
+
+    assert summary['Date'].tolist() == expected_summary['Date'].tolist()
+    assert summary['Day'].tolist() == expected_summary['Day'].tolist()
+    for column in ['pre_service_cust_count', 'post_service_customer_count', 'pre_service_total_cost',
+                   'post_service_total_cost', 'revenue', 'total_cost_variance']:
+        assert summary[column].tolist() == pytest.approx(expected_summary[column].tolist()), column
+    for column in expected_revenue.columns:
+        assert revenue_table[column].tolist() == pytest.approx(expected_revenue[column].tolist()), column
+    # The unparseable date is dropped, and customer counts missing on a whole meal count as nothing
+    assert summary['pre_service_cust_count'].tolist() == [200, 210, 410]
+    assert summary['post_service_customer_count'].tolist() == [330, 55, 385]
+
+
+def test_iso_weeks_of_halls_covering_different_spans():
+    frames = {'EVK': generate_export(3000, start='2025-03-31', seed=0),
+              'IRC': generate_export(3000, start='2025-04-07', seed=1)}
+    workbooks = build_iso_week_workbooks(frames)
+    assert [monday.date() for monday, _ in workbooks] == [datetime.date(2025, 3, 31), datetime.date(2025, 4, 7)]
+
+    for (monday, _), output in workbooks.items():
+        workbook = openpyxl.load_workbook(output)
+        assert workbook.sheetnames == ['EVK', 'IRC']
+        covered, empty = ('EVK', 'IRC') if monday.day == 31 else ('IRC', 'EVK')
+        # The hall without rows that week gets zero totals, with its 0/0 ratios left blank
+        assert [cell.value for cell in workbook[empty][4]] == ['Totals:', None, 0, 0, 0, 0, None]
+        assert [cell.value for cell in workbook[empty][7]][:5] == [0, None, None, None, None]
+        assert workbook[covered]['A11'].value == 'Totals:'
+
+
+def test_window_without_rows_raises():
+    indexed_halls = index_halls({'EVK': generate_export(300, start='2025-03-31')})
+    with pytest.raises(ValueError, match='No rows between'):
+        build_window_workbook(indexed_halls, '2025-05-05', '2025-05-11')
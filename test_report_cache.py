@@ -0,0 +1,17 @@
+import pytest
+
+from report_cache import ReportCache
+
+
+def test_failed_render_leaves_no_lock_behind():
+    cache = ReportCache()
+
+    def fail():
+        raise ValueError("bad upload")
+
+    for key in range(5):
+        with pytest.raises(ValueError):
+            cache.get_or_render(key, fail)
+    assert cache._rendering == {}
+    assert cache.get_or_render(0, lambda: b"report") == b"report"
+    assert cache._rendering == {}
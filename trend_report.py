@@ -0,0 +1,198 @@
+"""
+Trend report: rolling weekly and monthly metrics per hall across many periods.
+
+The inputs are the daily aggregates saved in an AggregateStore, never raw
+rows. Each hall's days are laid on one shared calendar and every rolling
+window is a running sum over it: moving the window by a day adds the day
+entering it and subtracts the one leaving, so a year of windows costs a
+single pass over a year of days.
+
+For each window (7 and 30 days) the workbook charts the forecast-vs-served
+cost variance of every hall and, per hall, the Waste / Reused / Donated share
+of its over production cost.
+
+    python trend_report.py --store aggregates.sqlite3 -o trends.xlsx
+    python trend_report.py --store aggregates.sqlite3 --start 2025-01-13 --end 2025-05-09 --hall EVK --hall UV
+"""
+import argparse
+import sys
+from io import BytesIO
+
+import pandas as pd
+import xlsxwriter
+
+from aggregate_store import DEFAULT_STORE_PATH, SERVICE_METRICS, AggregateStore
+from instrumentation import stage
+from styles import format_registry, workbook_options, write_rows
+
+# Window label -> length in days
+WINDOWS = {"7-day": 7, "30-day": 30}
+MIX_CATEGORIES = ["Waste", "Reused", "Donated"]
+DAILY_COLUMNS = [*SERVICE_METRICS, *MIX_CATEGORIES]
+
+
+def _mix_by_day(over_production: pd.DataFrame):
+    # (hall, date, category, total_cost) rows -> one column per MIX_CATEGORIES entry
+    categories = over_production["category"].replace({"Thrown": "Waste"})
+    mix = over_production.groupby(["hall", "date", categories])["total_cost"].sum().unstack(fill_value=0)
+    return mix.reindex(columns=MIX_CATEGORIES, fill_value=0)
+
+
+def _daily_frame(service: pd.DataFrame, mix: pd.DataFrame, halls):
+    daily = service.join(mix, how="outer").fillna(0)
+    daily = daily.reindex(columns=DAILY_COLUMNS, fill_value=0)
+    daily.attrs["halls"] = [hall for hall in halls if hall in daily.index.unique("hall")]
+    return daily
+
+
+def daily_metrics_from_store(store: AggregateStore, start=None, end=None, halls=None):
+    """Per (hall, date) service metrics and over production mix from the stored days in [start, end]."""
+    halls = list(halls or sorted(set(store.halls("service")) | set(store.halls("over_production"))))
+    if not halls:
+        raise ValueError("The store has no halls to build a trend from")
+    service = []
+    for hall in halls:
+        summary = store.service_summary(hall, start, end)
+        summary["date"] = pd.to_datetime(summary.pop("Date"))
+        service.append(summary.assign(hall=hall))
+    service = pd.concat(service, ignore_index=True).set_index(["hall", "date"])[SERVICE_METRICS]
+
+    over_production = store.over_production_days(start, end, halls)
+    return _daily_frame(service, _mix_by_day(over_production), halls)
+
+
+def rolling_metrics(daily: pd.DataFrame, windows: dict = None):
+    """
+    Rolling cost variance and over production mix per hall and day.
+
+    Each hall is reindexed onto the calendar spanning all halls, missing days
+    counting as zero, and summed with a trailing window per entry of
+    ``windows``. Ratios with a zero denominator are left empty (NaN).
+    """
+    windows = windows or WINDOWS
+    dates = daily.index.get_level_values("date")
+    calendar = pd.date_range(dates.min(), dates.max(), freq="D", name="date")
+    halls = daily.attrs.get("halls") or list(daily.index.unique("hall"))
+
+    trends = {}
+    for hall in halls:
+        days = daily.xs(hall, level="hall").reindex(calendar, fill_value=0)
+        columns = {}
+        for label, length in windows.items():
+            # min_periods=1: the first days of the calendar show the partial window so far
+            sums = days.rolling(length, min_periods=1).sum()
+            pre, post = sums["pre_service_total_cost"], sums["post_service_total_cost"]
+            columns[f"variance {label}"] = ((post - pre) / pre.where(pre != 0))
+            total = sums[MIX_CATEGORIES].sum(axis=1)
+            for category in MIX_CATEGORIES:
+                columns[f"{category} {label}"] = sums[category] / total.where(total != 0)
+        trends[hall] = pd.DataFrame(columns, index=calendar)
+    return pd.concat(trends, names=["hall", "date"])
+
+
+def _cells(frame: pd.DataFrame):
+    # xlsxwriter cannot write NaN; None leaves the cell blank
+    return frame.astype(object).where(frame.notna(), None).values.tolist()
+
+
+def build_trend_workbook(trends: pd.DataFrame, windows: dict = None, constant_memory: bool = False):
+    """Render rolling_metrics output: a cost variance sheet for all halls and a mix sheet per hall."""
+    windows = windows or WINDOWS
+    halls = list(trends.index.unique("hall"))
+    calendar = trends.index.unique("date")
+
+    output = BytesIO()
+    workbook = xlsxwriter.Workbook(output, workbook_options(constant_memory))
+    formats = format_registry(workbook)
+    header_format = formats.get({'bold': True, 'align': 'center', 'valign': 'vcenter', 'border': 1,
+                                 'bg_color': '#D9D9D9', 'text_wrap': True})
+    date_format = formats.get(num_format='mm/dd/yyyy', border=1)
+    percent_format = formats.get(num_format='0%', border=1)
+    last_row = len(calendar)
+
+    def add_line_chart(sheet_name, title, series, row, col):
+        chart = workbook.add_chart({'type': 'line'})
+        for name, column in series:
+            chart.add_series({
+                'name': name,
+                'categories': [sheet_name, 1, 0, last_row, 0],
+                'values': [sheet_name, 1, column, last_row, column],
+                'marker': {'type': 'none'},
+            })
+        chart.set_title({'name': title})
+        chart.set_x_axis({'date_axis': True, 'num_format': 'mm/dd'})
+        chart.set_y_axis({'num_format': '0%'})
+        chart.set_size({'width': 720, 'height': 300})
+        worksheet.insert_chart(row, col, chart)
+
+    # Cost variance: one column per (window, hall)
+    worksheet = workbook.add_worksheet("Cost Variance")
+    columns = [(label, hall) for label in windows for hall in halls]
+    worksheet.write_row(0, 0, ["Date"] + [f"{hall} {label}" for label, hall in columns], header_format)
+    variance = pd.DataFrame({f"{hall} {label}": trends.loc[hall, f"variance {label}"] for label, hall in columns})
+    rows = ([day] + values for day, values in zip(calendar, _cells(variance)))
+    worksheet.set_column(0, 0, 12)
+    worksheet.set_column(1, len(columns), 11)
+    write_rows(worksheet, 1, 0, rows, [date_format] + [percent_format] * len(columns))
+    for i, label in enumerate(windows):
+        series = [(hall, 1 + i * len(halls) + j) for j, hall in enumerate(halls)]
+        add_line_chart("Cost Variance", f"Total Cost Variance - {label} rolling", series, 1 + i * 16,
+                       len(columns) + 2)
+
+    # Over production mix: one sheet per hall, one column per (window, category)
+    for hall in halls:
+        sheet_name = f"{hall} Mix"
+        worksheet = workbook.add_worksheet(sheet_name)
+        columns = [f"{category} {label}" for label in windows for category in MIX_CATEGORIES]
+        worksheet.write_row(0, 0, ["Date"] + columns, header_format)
+        rows = ([day] + values for day, values in zip(calendar, _cells(trends.loc[hall, columns])))
+        worksheet.set_column(0, 0, 12)
+        worksheet.set_column(1, len(columns), 11)
+        write_rows(worksheet, 1, 0, rows, [date_format] + [percent_format] * len(columns))
+        for i, label in enumerate(windows):
+            series = [(category, 1 + i * len(MIX_CATEGORIES) + j) for j, category in enumerate(MIX_CATEGORIES)]
+            add_line_chart(sheet_name, f"{hall} Over Production Mix - {label} rolling", series, 1 + i * 16,
+                           len(columns) + 2)
+
+    workbook.close()
+    output.seek(0)
+    return output
+
+
+def trend_report(daily: pd.DataFrame, windows: dict = None, constant_memory: bool = False):
+    """Rolling metrics of a daily_metrics_* frame rendered as the trend workbook."""
+    if daily.empty:
+        raise ValueError("No daily aggregates to build a trend from")
+    with stage("trend.rolling", rows=len(daily)):
+        trends = rolling_metrics(daily, windows)
+    with stage("trend.render", rows=len(trends)):
+        return build_trend_workbook(trends, windows, constant_memory)
+
+
+def trend_report_from_store(store: AggregateStore, start=None, end=None, halls=None, constant_memory: bool = False):
+    with stage("trend.store_read"):
+        daily = daily_metrics_from_store(store, start, end, halls)
+    return trend_report(daily, constant_memory=constant_memory)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the rolling trend report from stored daily aggregates.")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="SQLite aggregate store to read")
+    parser.add_argument("-o", "--output", default="Over_Production_Trends.xlsx")
+    parser.add_argument("--start", default=None, help="first day to include")
+    parser.add_argument("--end", default=None, help="last day to include")
+    parser.add_argument("--hall", action="append", help="only these halls (repeatable)")
+    parser.add_argument("--constant-memory", action="store_true",
+                        help="use xlsxwriter's row-streaming mode when rendering")
+    args = parser.parse_args(argv)
+
+    buffer = trend_report_from_store(AggregateStore(args.store), args.start, args.end, args.hall,
+                                     args.constant_memory)
+    with open(args.output, "wb") as fh:
+        fh.write(buffer.getvalue())
+    print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
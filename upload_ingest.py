@@ -0,0 +1,217 @@
+"""
+Ingest of uploaded hall exports: validated and parsed as soon as they arrive.
+
+Each CSV is handed to a thread pool the moment it is uploaded. Its header and
+first rows are checked against the schema first (see
+schema.validate_export_csv), so a missing column or a file that is not an
+export is reported within a second, and the full typed parse then carries on
+in the background while the other files are still uploading. A zip archive or
+a folder is unpacked into its CSV files; the hall of each file comes from its
+name, and several files of one hall are read as one longer export.
+
+Parses live in this module's registry, keyed by file name and contents, so a
+Streamlit rerun with the same uploads picks up the work already under way.
+
+    python upload_ingest.py exports/ -o Weekly_Summary.xlsx
+    python upload_ingest.py exports.zip -o Weekly_Summary.xlsx
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import pandas as pd
+
+from ingest import HALL_SHEETS, content_hash, hall_from_name, read_csv_export
+from instrumentation import recording, stage
+from schema import WEEKLY_COLUMNS, apply_schema, validate_export_csv
+
+# Seconds a page waits for the first-rows check of new uploads before rendering
+VALIDATION_TIMEOUT = 1.0
+# Parses kept for later reruns
+MAX_PARSES = 64
+
+_pool = ThreadPoolExecutor(thread_name_prefix="upload-ingest")
+_parses = OrderedDict()
+_lock = threading.Lock()
+
+
+class UploadParse:
+    """Validation, then the full parse, of one uploaded CSV, running in the upload pool."""
+
+    def __init__(self, name: str, data: bytes, columns=None, digest: str = None):
+        self.name = name
+        self.hall = hall_from_name(os.path.basename(name))
+        self.digest = digest or content_hash(data)
+        self.rows = None
+        self.error = None
+        # Stage records of the parse, recorded on the pool thread for the report job to show
+        self.records = []
+        self.validated = threading.Event()
+        self._future = _pool.submit(self._run, data, columns)
+
+    def _run(self, data: bytes, columns):
+        try:
+            if self.hall is None:
+                raise ValueError(f"{self.name}: no hall code ({', '.join(HALL_SHEETS)}) in the file name")
+            validate_export_csv(BytesIO(data), columns, self.name)
+        except ValueError as exc:
+            self.error = str(exc)
+            raise
+        finally:
+            self.validated.set()
+        try:
+            with recording() as self.records, stage("weekly.ingest", hall=self.hall, file=self.name) as record:
+                frame = read_csv_export(data, columns)
+                record["rows"] = len(frame)
+        except Exception as exc:
+            self.error = f"{self.name}: {exc!r}"
+            raise
+        self.rows = len(frame)
+        return frame
+
+    @property
+    def status(self) -> str:
+        if self.error is not None:
+            return "invalid"
+        if not self.validated.is_set():
+            return "validating"
+        return "ready" if self._future.done() else "parsing"
+
+    def frame(self) -> pd.DataFrame:
+        """The typed export, waiting for the parse to finish."""
+        return self._future.result()
+
+
+def expand_uploads(uploads):
+    """(name, bytes) of every CSV in ``uploads``, with the CSVs of any .zip archive in place of the archive."""
+    for name, data in uploads:
+        if name.lower().endswith(".zip"):
+            with zipfile.ZipFile(BytesIO(data)) as archive:
+                for member in sorted(archive.namelist()):
+                    base = os.path.basename(member)
+                    if member.lower().endswith(".csv") and not base.startswith((".", "~$")):
+                        yield member, archive.read(member)
+        elif name.lower().endswith(".csv"):
+            yield name, data
+
+
+def folder_uploads(path: str):
+    """The .csv and .zip files directly inside ``path`` as (name, bytes) uploads, or ``path`` itself if a file."""
+    if not os.path.isdir(path):
+        with open(path, "rb") as fh:
+            return [(os.path.basename(path), fh.read())]
+    uploads = []
+    for name in sorted(os.listdir(path)):
+        file_path = os.path.join(path, name)
+        if os.path.isfile(file_path) and name.lower().endswith((".csv", ".zip")) and not name.startswith("~$"):
+            with open(file_path, "rb") as fh:
+                uploads.append((name, fh.read()))
+    return uploads
+
+
+def start_uploads(uploads, columns=WEEKLY_COLUMNS):
+    """
+    Start validating and parsing every CSV in ``uploads`` and return their
+    UploadParse objects. Files already started (same name and bytes) are not
+    parsed again.
+    """
+    parses = []
+    for name, data in expand_uploads(uploads):
+        digest = content_hash(data)
+        key = (name, digest, None if columns is None else tuple(columns))
+        with _lock:
+            parse = _parses.get(key)
+            if parse is None:
+                parse = _parses[key] = UploadParse(name, data, columns, digest)
+            _parses.move_to_end(key)
+            while len(_parses) > MAX_PARSES:
+                _parses.popitem(last=False)
+        parses.append(parse)
+    return parses
+
+
+def wait_validated(parses, timeout: float = VALIDATION_TIMEOUT) -> bool:
+    """Wait up to ``timeout`` seconds in total for the first-rows check of every parse."""
+    deadline = time.monotonic() + timeout
+    return all(parse.validated.wait(max(0.0, deadline - time.monotonic())) for parse in parses)
+
+
+def problems(parses, halls=HALL_SHEETS):
+    """Messages for invalid files and for halls without any file."""
+    found = {parse.hall for parse in parses}
+    messages = [parse.error for parse in parses if parse.error is not None]
+    missing = [hall for hall in halls if hall not in found]
+    if missing:
+        messages.append(f"Missing hall files: {', '.join(missing)}")
+    return messages
+
+
+def uploads_fingerprint(parses) -> str:
+    """report_cache.inputs_fingerprint of the parsed files, from the digests they already have."""
+    return content_hash("\x1f".join(f"{parse.name}={parse.digest}" for parse in parses).encode())
+
+
+def hall_frames(parses, halls=HALL_SHEETS) -> dict:
+    """
+    One typed frame per hall, in ``halls`` order, waiting for parses still
+    running. Several files of a hall are concatenated. Raises ValueError
+    listing the problems if any file is invalid or a hall has no file.
+    """
+    for parse in parses:
+        try:
+            parse.frame()
+        except Exception:
+            pass  # recorded in parse.error
+    messages = problems(parses, halls)
+    if messages:
+        raise ValueError("; ".join(messages))
+
+    frames = {}
+    for hall in halls:
+        hall_parses = [parse for parse in parses if parse.hall == hall]
+        if len(hall_parses) == 1:
+            frames[hall] = hall_parses[0].frame()
+        else:
+            # Category columns of different files have different categories; retype the combined rows
+            frames[hall] = apply_schema(pd.concat([parse.frame() for parse in hall_parses], ignore_index=True))
+    return frames
+
+
+def main(argv=None):
+    from generate_weekly_report import build_weekly_workbook
+
+    parser = argparse.ArgumentParser(description="Validate and parse a folder or zip of hall CSV exports in "
+                                                 "parallel and build the weekly workbook from them.")
+    parser.add_argument("source", help="folder or .zip archive of per-hall .csv exports")
+    parser.add_argument("-o", "--output", default="Weekly_Summary.xlsx")
+    args = parser.parse_args(argv)
+
+    parses = start_uploads(folder_uploads(args.source))
+    wait_validated(parses)
+    messages = problems(parses)
+    if messages:
+        for message in messages:
+            print(message, file=sys.stderr)
+        return 1
+    for parse in parses:
+        print(f"{parse.hall}: {parse.name} ({parse.status})")
+
+    try:
+        frames = hall_frames(parses)
+    except ValueError as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    with open(args.output, "wb") as fh:
+        fh.write(build_weekly_workbook(frames).getvalue())
+    print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
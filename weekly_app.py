@@ -1,57 +1,118 @@
-from io import BytesIO
+import time
+import zipfile
 
-import pandas as pd
 import streamlit as st
-import xlsxwriter
 
-from generate_weekly_report import add_report
+from instrumentation import is_enabled, recording, render_sidebar
+from report_jobs import get_job, start_weekly_job
+from upload_ingest import hall_frames, problems, start_uploads, uploads_fingerprint, wait_validated
+
+# Seconds between progress refreshes while a job runs
+POLL_INTERVAL = 1.0
 
 
 def main():
     st.set_page_config(layout="wide")
 
+    # Per-stage timings for this run, shown in the sidebar
+    record_timings = st.sidebar.checkbox("⏱️ Record stage timings", value=is_enabled())
+    with recording(enabled=record_timings) as records:
+        report_page(record_timings)
+    render_sidebar(records)
+
+
+def report_page(record_timings: bool = False):
     st.title("Residential - Over Production - Weekly Report")
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.write("Upload IRC Over Production Excel file")
-        irc_file = st.file_uploader("", type=["csv"], key="irc_file")
-    with col2:
-        st.write("Upload EVK Over Production Excel file")
-        evk_file = st.file_uploader("", type=["csv"], key="evk_file")
-    with col3:
-        st.write("Upload UV Over Production Excel file")
-        uv_file = st.file_uploader("", type=["csv"], key="uv_file")
-
-    # Ensure all three files are uploaded
-    if irc_file and evk_file and uv_file:
-        irc_df = pd.read_csv(irc_file)
-        evk_df = pd.read_csv(evk_file)
-        uv_df = pd.read_csv(uv_file)
-        st.success("✅ All files uploaded successfully!")
-
-        # **Generate Report Button**
-        if st.button("📥 Generate Report"):
-            output = BytesIO()
-            workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-            evk_worksheet = workbook.add_worksheet('EVK')
-            add_report(evk_df, workbook, evk_worksheet)
-            irc_worksheet = workbook.add_worksheet('IRC')
-            add_report(irc_df, workbook, irc_worksheet)
-            uv_worksheet = workbook.add_worksheet('UV')
-            add_report(uv_df, workbook, uv_worksheet)
-
-            workbook.close()
-            output.seek(0)
-
-            # Provide the report as a downloadable link
-            st.download_button(
-                label="📥 Download Report",
-                data=output,
-                file_name="Weekly_Summary.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
-    else:
+
+    # A running or finished job is addressed by ?job=<id>, so refreshing the page keeps it
+    job_id = st.experimental_get_query_params().get("job", [None])[0]
+    if job_id:
+        show_job(job_id, record_timings)
+        return
+
+    uploads = st.file_uploader("Upload the EVK, IRC and UV Over Production CSV files, or a zip of them",
+                               type=["csv", "zip"], accept_multiple_files=True, key="weekly_files")
+    if not uploads:
         st.warning("⚠️ Please upload all three files before proceeding.")
+        return
+
+    # Each file is checked and parsed in the background from the moment it is uploaded
+    try:
+        parses = start_uploads((upload.name, upload.getvalue()) for upload in uploads)
+    except zipfile.BadZipFile as exc:
+        st.error(f"Could not open the zip archive: {exc}")
+        return
+    validated = wait_validated(parses)
+
+    icons = {"validating": "⏳", "parsing": "⚙️", "ready": "✅", "invalid": "❌"}
+    for parse in parses:
+        rows = f", {parse.rows:,} rows" if parse.rows is not None else ""
+        st.write(f"{icons[parse.status]} {parse.hall or '?'} - {parse.name} ({parse.status}{rows})")
+
+    messages = problems(parses)
+    if messages:
+        for message in messages:
+            st.error(message)
+        return
+    if not validated:
+        # Check again shortly rather than report success for files still being checked
+        st.info("⏳ Checking the uploaded files...")
+        time.sleep(POLL_INTERVAL)
+        st.experimental_rerun()
+    st.success("✅ All files uploaded successfully!")
+
+    # **Generate Report Button**
+    if st.button("📥 Generate Report"):
+        try:
+            frames = hall_frames(parses)
+        except ValueError as exc:
+            st.error(str(exc))
+            return
+        # Halls are aggregated in parallel in the background
+        job_id = start_weekly_job(frames, fingerprint=uploads_fingerprint(parses),
+                                  records=[record for parse in parses for record in parse.records])
+        st.experimental_set_query_params(job=job_id)
+        st.experimental_rerun()
+
+
+def show_job(job_id: str, record_timings: bool = False):
+    job = get_job(job_id)
+    if job is None:
+        st.error("This report job is no longer available. Please generate the report again.")
+        if st.button("Start over"):
+            st.experimental_set_query_params()
+            st.experimental_rerun()
+        return
+
+    icons = {"queued": "⏳", "running": "⚙️", "done": "✅", "failed": "❌"}
+    columns = st.columns(len(job["halls"]))
+    for column, (hall, status) in zip(columns, job["halls"].items()):
+        column.metric(hall, f"{icons[status]} {status}")
+    finished_halls = sum(status in ("done", "failed") for status in job["halls"].values())
+    st.progress(finished_halls / len(job["halls"]))
+    st.caption(f"Job {job_id} - {job['elapsed']:.1f}s")
+
+    if job["status"] == "done":
+        st.success("✅ Report ready")
+        # Provide the report as a downloadable link
+        st.download_button(
+            label="📥 Download Report",
+            data=job["result"],
+            file_name="Weekly_Summary.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+        if record_timings:
+            render_sidebar(job["records"])
+    elif job["status"] == "failed":
+        st.error("Report generation failed")
+        st.code(job["error"])
+    else:
+        time.sleep(POLL_INTERVAL)
+        st.experimental_rerun()
+
+    if st.button("New report"):
+        st.experimental_set_query_params()
+        st.experimental_rerun()
 
 
 if __name__ == '__main__':